@@ -0,0 +1,19 @@
+"""
+Settings profile is selected by DJANGO_ENV environment variable:
+dev (default), test or prod
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+
+DJANGO_ENV = os.getenv('DJANGO_ENV', 'dev')
+
+if DJANGO_ENV == 'dev':
+    from .dev import *  # noqa: F401,F403
+elif DJANGO_ENV == 'test':
+    from .test import *  # noqa: F401,F403
+elif DJANGO_ENV == 'prod':
+    from .prod import *  # noqa: F401,F403
+else:
+    raise ImproperlyConfigured(f'Unknown settings profile DJANGO_ENV={DJANGO_ENV}')
@@ -7,13 +7,14 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
-BASE_DIR = Path(__file__).resolve().parent.parent
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
 
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = os.getenv('SECRET_KEY')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# It's turned on by dev profile only
+DEBUG = False
 
 ALLOWED_HOSTS = [
     '127.0.0.1',
@@ -29,7 +30,6 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'phonenumber_field',
-    'debug_toolbar',
     'shop.apps.ShopConfig',
 ]
 
@@ -40,20 +40,22 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'shop.middleware.CartMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
 AUTH_USER_MODEL = 'shop.User'
 
 ROOT_URLCONF = 'cables_shop.urls'
 
+# Templates are read and compiled once per process in every profile,
+# shop templates are compiled on startup by ShopConfig.ready.
+# Runserver autoreloader resets the cache when templates change
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -61,6 +63,11 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -68,17 +75,52 @@ TEMPLATES = [
 WSGI_APPLICATION = 'cables_shop.wsgi.application'
 
 # Database
+# Persistent connections save connect and TLS handshake on each request,
+# every server worker thread keeps its own one. Reused connection is pinged
+# on first database use in request and replaced if broken. Django 4.0 ignores
+# CONN_HEALTH_CHECKS, it's read by shop.backends.postgresql backend
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
+        'ENGINE': 'shop.backends.postgresql',
         'NAME': 'audio_store_django',
         'USER': 'sergey',
         'PASSWORD': os.getenv('DATABASE_PASSWORD'),
         'HOST': os.getenv('DATABASE_HOST'),
-        'PORT': 5432,
+        'PORT': os.getenv('DATABASE_PORT', 5432),
+        'CONN_MAX_AGE': int(os.getenv('DATABASE_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+# DATABASE_POOLER=pgbouncer is for PgBouncer in transaction pool mode.
+# Server connection is bound to client only for a transaction, so nothing
+# session wide may be used: server side cursors are turned off, checkout and
+# cart locks are taken inside transaction.atomic blocks. PgBouncer server
+# timezone must be UTC, as Django sets it only once on connect
+if os.getenv('DATABASE_POOLER') == 'pgbouncer':
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+# Cache
+# Catalogue pages fragments are cached. Use file based cache
+# (CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+# and CACHE_LOCATION=/path/to/dir) to share it between processes,
+# prod profile doesn't allow process local one
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
     }
 }
 
+# Sessions
+# Signed cookies keep anonymous customers carts without database writes
+SESSION_ENGINE = os.getenv(
+    'SESSION_ENGINE',
+    'django.contrib.sessions.backends.signed_cookies'
+)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -111,10 +153,8 @@ STATICFILES_DIRS = []
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Uploads are named by content hash and cached by browsers for a year
+DEFAULT_FILE_STORAGE = 'shop.storage.ContentHashStorage'
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
-
-INTERNAL_IPS = [
-    '127.0.0.1',
-]
@@ -0,0 +1,19 @@
+from .base import *  # noqa: F401,F403
+from .base import INSTALLED_APPS, MIDDLEWARE
+
+
+DEBUG = True
+
+# Debug toolbar is only needed in development, its middleware is also sync only
+INSTALLED_APPS = INSTALLED_APPS + ['debug_toolbar']
+MIDDLEWARE = MIDDLEWARE + ['debug_toolbar.middleware.DebugToolbarMiddleware']
+
+INTERNAL_IPS = [
+    '127.0.0.1',
+]
+
+# Toolbar finds templates by app directories loader, but its check
+# doesn't see the loader wrapped by cached one
+SILENCED_SYSTEM_CHECKS = [
+    'debug_toolbar.W006',
+]
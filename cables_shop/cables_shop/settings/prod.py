@@ -0,0 +1,50 @@
+import os
+import tempfile
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .base import *  # noqa: F401,F403
+from .base import TEMPLATES
+
+
+DEBUG = False
+
+# Debug context processor is dropped, SQL queries are not recorded without DEBUG
+TEMPLATES = [
+    {
+        **TEMPLATES[0],
+        'OPTIONS': {
+            **TEMPLATES[0]['OPTIONS'],
+            'context_processors': [
+                context_processor
+                for context_processor in TEMPLATES[0]['OPTIONS']['context_processors']
+                if context_processor != 'django.template.context_processors.debug'
+            ],
+        },
+    },
+]
+
+# Hashed names and gzip/brotli variants served by WhiteNoise are made by collectstatic,
+# shop CSS and JS are bundled by build_assets command beforehand
+STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+
+# Catalogue version invalidating cached pages is kept in cache, so the cache
+# must be shared by all gunicorn worker processes. File based cache is shared
+# on one host, Redis or Memcached is needed if app runs on several hosts
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            os.path.join(tempfile.gettempdir(), 'cables_shop_cache')
+        ),
+    }
+}
+if CACHES['default']['BACKEND'] == 'django.core.cache.backends.locmem.LocMemCache':
+    raise ImproperlyConfigured(
+        'Local memory cache is not shared by server processes, '
+        'catalogue changes would not reach all of them'
+    )
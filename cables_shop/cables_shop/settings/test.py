@@ -0,0 +1,11 @@
+import os
+
+from .base import *  # noqa: F401,F403
+
+
+SECRET_KEY = os.getenv('SECRET_KEY', 'test-secret-key')
+
+# Tests create a lot of users, strong hashing only slows them down
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.MD5PasswordHasher',
+]
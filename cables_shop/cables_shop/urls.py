@@ -1,15 +1,21 @@
-from django.conf.urls.static import static
+from django.conf import settings
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
 
-from . import settings
+from shop.views import serve_media
 
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('shop.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]
 
+# Django serves uploads only in development, front server does it in production
 if settings.DEBUG:
+    urlpatterns.append(
+        re_path(rf'^{settings.MEDIA_URL.lstrip("/")}(?P<path>.*)$', serve_media)
+    )
+
+if 'debug_toolbar' in settings.INSTALLED_APPS:
     import debug_toolbar
     urlpatterns.extend([path('__debug__/', include(debug_toolbar.urls))])
\ No newline at end of file
@@ -0,0 +1,36 @@
+"""
+Production app server config, runserver is for development only.
+Run from this directory: gunicorn
+Settings are read from environment, defaults fit container with all its cores
+"""
+import multiprocessing
+import os
+
+
+# Production settings profile, see cables_shop/settings
+os.environ.setdefault('DJANGO_ENV', 'prod')
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+# Workers are restarted from time to time, so leaks can't grow endlessly
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+wsgi_app = 'cables_shop.wsgi:application'
+# App is loaded once in master process and shared by forked workers
+preload_app = True
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+
+
+def when_ready(server):
+    """ Runs in master process after app is loaded and before workers are forked """
+    from shop import utils
+
+    utils.warm_up()
+    server.log.info('URL patterns are warmed up')
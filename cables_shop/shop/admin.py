@@ -1,4 +1,6 @@
 from django.contrib import admin
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
 
 from .models import *
 
@@ -21,10 +23,42 @@ class CableAdmin(admin.ModelAdmin):
 
 @admin.register(CablePhoto)
 class CablePhotoAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'cable', 'is_title', 'photo')
+    list_display = ('pk', 'cable', 'is_title', 'photo', 'variants_job_status')
     list_display_links = ('cable',)
     list_filter = ('cable', 'is_title')
 
+    def get_queryset(self, request):
+        last_job = PhotoVariantsJob.objects.filter(cable_photo=OuterRef('pk')).order_by('-pk')
+        return super().get_queryset(request).annotate(
+            last_job_status=Subquery(last_job.values('status')[:1]),
+            last_job_attempts=Subquery(last_job.values('attempts')[:1]),
+        )
+
+    @admin.display(description='варианты фото')
+    def variants_job_status(self, obj):
+        if obj.last_job_status is None:
+            return '-'
+        status = PhotoVariantsJob.JobStatus(obj.last_job_status).label
+        return f'{status}, попыток: {obj.last_job_attempts}'
+
+
+@admin.register(PhotoVariantsJob)
+class PhotoVariantsJobAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'cable_photo', 'cable_type', 'status', 'attempts', 'run_after', 'updated_at'
+    )
+    list_filter = ('status',)
+    readonly_fields = ('attempts', 'error', 'created_at', 'updated_at')
+    actions = ('retry_jobs',)
+
+    @admin.action(description='Повторить выбранные задачи')
+    def retry_jobs(self, request, queryset):
+        queryset.update(
+            status=PhotoVariantsJob.JobStatus.PENDING,
+            attempts=0,
+            run_after=timezone.now(),
+        )
+
 
 # Orders related
 @admin.register(User)
@@ -43,9 +77,16 @@ class ShippingAddressAdmin(admin.ModelAdmin):
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ('id', 'customer', 'status')
+    list_display = ('id', 'customer', 'status', 'items_total', 'products_total_price')
     list_filter = ('status', 'customer')
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_totals()
+
+    @admin.display(description='стоимость товаров, руб.', ordering='products_price_sum')
+    def products_total_price(self, order: Order) -> int:
+        return order.products_total_price
+
 
 @admin.register(OrderedProduct)
 class OrderedProductAdmin(admin.ModelAdmin):
@@ -0,0 +1,40 @@
+from django.db.backends.postgresql import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL backend with CONN_HEALTH_CHECKS, which Django supports itself
+    only since 4.1. As there, reused persistent connection is pinged lazily,
+    once per request on first database use, and replaced if it was broken
+    while idle, e.g. by database or pooler restart. Requests not using
+    database, like static files or 304 responses, don't pay for the ping
+    """
+    health_check_done = False
+
+    @property
+    def health_check_enabled(self) -> bool:
+        return bool(self.settings_dict.get('CONN_HEALTH_CHECKS'))
+
+    def connect(self) -> None:
+        # New connection doesn't need a check in current request. It's marked
+        # before connecting, as connect itself sets autocommit through ensure_connection
+        self.health_check_done = True
+        super().connect()
+
+    def close_if_unusable_or_obsolete(self) -> None:
+        # Called at request start and finish, so next request checks connection
+        # again. Autocommit is read here through ensure_connection, it mustn't ping
+        self.health_check_done = True
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def close_if_health_check_failed(self) -> None:
+        if self.connection is None or not self.health_check_enabled or self.health_check_done:
+            return
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def ensure_connection(self) -> None:
+        self.close_if_health_check_failed()
+        super().ensure_connection()
@@ -1,8 +1,51 @@
 DELIVERY_PRICE = 500
 
+# Operations in one cart update request, see CartUpdateService
+CART_UPDATE_MAX_OPERATIONS = 100
+# Session key of anonymous customer cart, see SessionCart
+SESSION_CART_KEY = 'cart'
+
+# Cables on all cables page
+CABLES_PAGE_SIZE = 24
+
+# Photo variants, see shop.images
+PHOTO_VARIANT_WIDTHS = (70, 160, 320, 640, 1280)
+PHOTO_HASH_LENGTH = 12
+# Photo variants jobs, seconds
+PHOTO_JOB_MAX_ATTEMPTS = 5
+PHOTO_JOB_RETRY_DELAY = 30
+PHOTO_JOB_TIMEOUT = 60 * 10
+
+# Static bundles built by build_assets command, files are taken from static dirs
+STATIC_BUNDLES = {
+    'shop/dist/shop.css': (
+        'shop/css/bootstrap.css',
+        'shop/css/switch.css',
+        'shop/css/styles.css',
+    ),
+    'shop/dist/shop.js': (
+        'shop/vendor/popper.min.js',
+        'shop/vendor/bootstrap.min.js',
+        'shop/js/cart.js',
+        'shop/js/cable_filters.js',
+    ),
+}
+
+# Uploads named by content hash, seconds
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+
+# Search
+SEARCH_RESULTS_LIMIT = 48
+SEARCH_QUERY_MAX_LENGTH = 100
+
+# Catalogue pages cache
+CATALOGUE_VERSION_CACHE_KEY = 'catalogue_version'
+CATALOGUE_CACHE_TIMEOUT = 60 * 60 * 24
+
 # Titles
 INDEX_PAGE_TITLE = 'Hi-Fi store'
 ALL_CABLES_PAGE_TITLE = 'Hi-Fi store - товары'
+SEARCH_PAGE_TITLE = 'Hi-Fi store - Поиск'
 CART_PAGE_TITLE = 'Hi-Fi store - Корзина'
 CHECKOUT_PAGE_TITLE = 'Hi-Fi store - Оформление заказа'
 REGISTRATION_PAGE_TITLE = 'Hi-Fi store - Регистрация'
@@ -1,9 +1,11 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
+from django.db.models import QuerySet
+from django.http import QueryDict
 from phonenumber_field import formfields
 
 from shop import utils
-from shop.models import User
+from shop.models import Cable, CableType, User
 
 
 class UserRegistrationForm(UserCreationForm):
@@ -168,3 +170,82 @@ class UserInformationForm(forms.Form):
             'zipcode': last_address.zipcode if last_address else '',
         }
         return initials
+
+
+class CableFilterForm(forms.Form):
+    """
+    Filters and keyset pagination cursor for all cables page.
+    All fields are optional, invalid values are ignored
+    """
+    type = forms.ModelMultipleChoiceField(
+        queryset=CableType.objects.all(),
+        required=False,
+    )
+    min_price = forms.IntegerField(
+        label='Цена от',
+        min_value=0,
+        required=False,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'от'}),
+    )
+    max_price = forms.IntegerField(
+        label='Цена до',
+        min_value=0,
+        required=False,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'до'}),
+    )
+    length = forms.IntegerField(
+        label='Длина, см.',
+        min_value=0,
+        required=False,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'см.'}),
+    )
+    in_stock = forms.BooleanField(
+        label='В наличии',
+        required=False,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+    )
+    # "type-price-pk" of the last cable on previous page
+    after = forms.RegexField(
+        regex=r'^\d+-\d+-\d+$',
+        required=False,
+        widget=forms.HiddenInput,
+    )
+
+    def filter_cables(self, cables: QuerySet[Cable]) -> QuerySet[Cable]:
+        """ Apply valid filters and cursor to cables queryset """
+        self.is_valid()
+        filters = self.cleaned_data
+
+        if filters.get('type'):
+            cables = cables.filter(type__in=filters['type'])
+        if filters.get('min_price') is not None:
+            cables = cables.filter(price__gte=filters['min_price'])
+        if filters.get('max_price') is not None:
+            cables = cables.filter(price__lte=filters['max_price'])
+        if filters.get('length') is not None:
+            cables = cables.filter(length_sm=filters['length'])
+        if filters.get('in_stock'):
+            cables = cables.filter(units_in_stock__gt=0)
+        if filters.get('after'):
+            type_id, price, pk = map(int, filters['after'].split('-'))
+            cables = cables.after(type_id, price, pk)
+        return cables.order_by('type_id', 'price', 'pk')
+
+    def get_valid_query(self) -> QueryDict:
+        """
+        Valid filters and cursor in fields order, invalid and unknown
+        parameters are dropped. Must be called after filter_cables
+        """
+        query = QueryDict(mutable=True)
+        for name in self.fields:
+            value = self.cleaned_data.get(name)
+            if name == 'type':
+                # Valid data has only existing pks, it's used to avoid query
+                if value:
+                    query.setlist(name, sorted({int(pk) for pk in self.data.getlist(name)}))
+            elif isinstance(value, bool):
+                if value:
+                    query[name] = 'on'
+            elif value is not None and value != '':
+                query[name] = value
+        return query
@@ -0,0 +1,222 @@
+"""
+Responsive photo variants.
+
+Each uploaded photo gets resized copies of several widths,
+encoded in a fallback format (JPEG or PNG for images with transparency)
+and in WebP/AVIF if Pillow supports them.
+Variants are stored next to the original and named by hash of original content,
+their names are kept in photo_variants field of the model.
+Variants are made by run_image_worker command, see shop.photo_jobs
+"""
+import hashlib
+import io
+import os
+from typing import NamedTuple, Optional
+
+from django.core.files.base import ContentFile
+from django.db.models.fields.files import FieldFile
+from PIL import Image, ImageOps, features
+
+from shop import config
+
+
+# Preferred first in <picture> sources
+MODERN_FORMATS = tuple(
+    image_format for image_format in ('avif', 'webp') if features.check(image_format)
+)
+MIME_TYPES = {
+    'avif': 'image/avif',
+    'webp': 'image/webp',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+}
+SAVE_OPTIONS = {
+    'avif': {'quality': 60},
+    'webp': {'quality': 80},
+    'jpeg': {'quality': 82, 'optimize': True, 'progressive': True},
+    'png': {'optimize': True},
+}
+EXIF_ORIENTATION = 0x0112
+EXTENSIONS = {'avif': 'avif', 'webp': 'webp', 'jpeg': 'jpg', 'png': 'png'}
+
+
+class ResponsivePhoto:
+    """ Original photo along with its variants, used to render <picture> """
+
+    def __init__(self, field_file: Optional[FieldFile], variants: Optional[dict]):
+        self.field_file = field_file
+        self.variants = variants or {}
+
+    def __bool__(self):
+        return bool(self.field_file)
+
+    @property
+    def url(self) -> str:
+        return self.field_file.url if self else ''
+
+    def get_images(self, image_format: str) -> list[tuple[int, str]]:
+        """ Variants of the format as (width, name) sorted by width """
+        images = self.variants.get('images', {}).get(image_format, {})
+        return sorted((int(width), name) for width, name in images.items())
+
+    def thumbnail_url(self, width: int) -> str:
+        """
+        URL of the narrowest fallback variant not narrower than width,
+        widest variant or original photo if there are no such
+        """
+        if not self:
+            return ''
+        images = self.get_images(self.variants.get('fallback', ''))
+        for image_width, name in images:
+            if image_width >= width:
+                return self.field_file.storage.url(name)
+        if images:
+            return self.field_file.storage.url(images[-1][1])
+        return self.url
+
+    def get_srcset(self, image_format: str) -> str:
+        return ', '.join(
+            f'{self.field_file.storage.url(name)} {width}w'
+            for width, name in self.get_images(image_format)
+        )
+
+    @property
+    def srcset(self) -> str:
+        return self.get_srcset(self.variants.get('fallback', ''))
+
+    @property
+    def sources(self) -> list[tuple[str, str]]:
+        """ (mime type, srcset) of modern formats variants """
+        return [
+            (MIME_TYPES[image_format], self.get_srcset(image_format))
+            for image_format in self.variants.get('images', {})
+            if image_format != self.variants.get('fallback')
+        ]
+
+
+def get_content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()[:config.PHOTO_HASH_LENGTH]
+
+
+def get_variant_name(source_name: str, content_hash: str, width: int, image_format: str) -> str:
+    stem, _ = os.path.splitext(source_name)
+    # Source stored by ContentHashStorage is already named by the same hash
+    if not stem.endswith(f'.{content_hash}'):
+        stem = f'{stem}.{content_hash}'
+    return f'{stem}.{width}w.{EXTENSIONS[image_format]}'
+
+
+def get_variant_widths(image_width: int) -> list[int]:
+    """ Configured widths, never upscaling the image """
+    widths = [width for width in config.PHOTO_VARIANT_WIDTHS if width < image_width]
+    return widths or [image_width]
+
+
+def get_oriented_size(image: Image.Image) -> tuple[int, int]:
+    """ Image size after applying EXIF orientation, without decoding it """
+    # Orientations 5-8 rotate image by 90 degrees
+    if image.getexif().get(EXIF_ORIENTATION, 1) in (5, 6, 7, 8):
+        return image.height, image.width
+    return image.size
+
+
+def encode_variant(image: Image.Image, width: int, image_format: str) -> bytes:
+    height = max(1, round(image.height * width / image.width))
+    resized = image.resize((width, height), Image.Resampling.LANCZOS)
+    if image_format == 'jpeg':
+        resized = resized.convert('RGB')
+    buffer = io.BytesIO()
+    resized.save(buffer, format=image_format, **SAVE_OPTIONS[image_format])
+    return buffer.getvalue()
+
+
+class VariantsBuild(NamedTuple):
+    variants: dict
+    created: int
+    skipped: int
+    source_size: int
+    served_size: int
+
+
+def build_variants(field_file: FieldFile, dry_run: bool = False) -> VariantsBuild:
+    """
+    Create missing variants files for photo.
+    Names are content based, so existing file is the same variant and is skipped.
+    With dry_run only counts variants to create
+    """
+    with field_file.open('rb') as source:
+        content = source.read()
+    content_hash = get_content_hash(content)
+
+    with Image.open(io.BytesIO(content)) as image:
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        fallback = 'png' if has_alpha else 'jpeg'
+        width, _ = get_oriented_size(image)
+        images = {
+            image_format: {
+                str(variant_width): get_variant_name(
+                    field_file.name, content_hash, variant_width, image_format
+                )
+                for variant_width in get_variant_widths(width)
+            }
+            for image_format in (*MODERN_FORMATS, fallback)
+        }
+        missing = [
+            (image_format, int(variant_width), name)
+            for image_format, format_images in images.items()
+            for variant_width, name in format_images.items()
+            if not field_file.storage.exists(name)
+        ]
+        if missing and not dry_run:
+            # Decoding only when there is something to encode
+            image = ImageOps.exif_transpose(image).convert('RGBA' if has_alpha else 'RGB')
+            for image_format, variant_width, name in missing:
+                saved_name = field_file.storage.save(
+                    name, ContentFile(encode_variant(image, variant_width, image_format))
+                )
+                images[image_format][str(variant_width)] = saved_name
+
+    served_size = 0
+    if not dry_run:
+        served_images = images[(*MODERN_FORMATS, fallback)[0]]
+        served_size = field_file.storage.size(served_images[max(served_images, key=int)])
+    return VariantsBuild(
+        variants={
+            'source': field_file.name,
+            'hash': content_hash,
+            'fallback': fallback,
+            'images': images,
+        },
+        created=len(missing),
+        skipped=sum(map(len, images.values())) - len(missing),
+        source_size=len(content),
+        served_size=served_size,
+    )
+
+
+def generate_variants(field_file: FieldFile) -> dict:
+    """ Create variants files for photo, returns photo_variants field value """
+    return build_variants(field_file).variants
+
+
+def verify_variants(field_file: FieldFile, variants: dict) -> list[str]:
+    """ Problems with photo variants files, e.g. after restore from backup """
+    if not variants:
+        return ['no variants']
+    problems = []
+    with field_file.open('rb') as source:
+        if get_content_hash(source.read()) != variants['hash']:
+            problems.append('photo changed since variants were made')
+    for image_format, format_images in variants['images'].items():
+        for width, name in format_images.items():
+            try:
+                with field_file.storage.open(name, 'rb') as variant_file:
+                    with Image.open(variant_file) as image:
+                        image.verify()
+                        if image.width != int(width) or image.format.lower() != image_format:
+                            problems.append(f'{name}: unexpected {image.format} {image.width}px')
+            except FileNotFoundError:
+                problems.append(f'{name}: missing')
+            except Exception as error:
+                problems.append(f'{name}: {error!r}')
+    return problems
@@ -0,0 +1,60 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+
+from shop.models import Cable
+
+
+class Command(BaseCommand):
+    help = (
+        'Visits catalogue pages repeatedly like a browser, sending back '
+        'received ETag, and reports how many page renders were skipped'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--visits',
+            type=int,
+            default=10,
+            help='Number of visits of each page',
+        )
+
+    def handle(self, *args, **options):
+        urls = [reverse('all_cables_page')] + [
+            cable.get_absolute_url()
+            for cable in Cable.objects.filter(is_for_sale=True)
+        ]
+        client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+
+        rendered = not_modified = 0
+        rendered_time = not_modified_time = 0.0
+        for url in urls:
+            etag = None
+            for _ in range(options['visits']):
+                headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+                start = time.perf_counter()
+                response = client.get(url, **headers)
+                elapsed = time.perf_counter() - start
+
+                if response.status_code == 304:
+                    not_modified += 1
+                    not_modified_time += elapsed
+                else:
+                    rendered += 1
+                    rendered_time += elapsed
+                etag = response.get('ETag')
+
+        total = rendered + not_modified
+        self.stdout.write(f'Pages: {len(urls)}, requests: {total}')
+        self.stdout.write(
+            f'Rendered: {rendered}, '
+            f'avg {rendered_time / max(rendered, 1) * 1000:.2f} ms'
+        )
+        self.stdout.write(
+            f'Not modified (render skipped): {not_modified} '
+            f'({not_modified / max(total, 1):.0%}), '
+            f'avg {not_modified_time / max(not_modified, 1) * 1000:.2f} ms'
+        )
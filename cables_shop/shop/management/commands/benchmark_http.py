@@ -0,0 +1,117 @@
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import client, cookies
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+
+class Command(BaseCommand):
+    help = (
+        'Sends requests to running server over concurrent keep-alive connections '
+        'and reports throughput and latency. Run it with the same options against '
+        'differently configured servers to compare them under identical load'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths',
+            nargs='+',
+            help='Paths requested in turn by each connection',
+        )
+        parser.add_argument(
+            '--host',
+            default='127.0.0.1:8000',
+            help='Server host and port',
+        )
+        parser.add_argument(
+            '--connections',
+            type=int,
+            default=32,
+            help='Number of concurrent connections',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=2000,
+            help='Total number of requests',
+        )
+        parser.add_argument(
+            '--cart-product',
+            type=int,
+            help='Id of cable to add to session cart by every other request',
+        )
+
+    def handle(self, *args, **options):
+        connections = options['connections']
+        requests_per_connection = max(options['requests'] // connections, 1)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            results = list(executor.map(
+                lambda _: self.run_connection(
+                    options['host'],
+                    options['paths'],
+                    requests_per_connection,
+                    options['cart_product'],
+                ),
+                range(connections),
+            ))
+        elapsed = time.perf_counter() - start
+
+        latencies = sorted(latency for connection_latencies, _ in results for latency in connection_latencies)
+        errors = sum(connection_errors for _, connection_errors in results)
+        if not latencies:
+            raise CommandError('No requests were made')
+        percentiles = statistics.quantiles(latencies, n=100)
+        self.stdout.write(
+            f'Requests: {len(latencies)} in {elapsed:.1f} s, errors: {errors}, '
+            f'{len(latencies) / elapsed:.1f} requests/s'
+        )
+        self.stdout.write(
+            f'Latency, ms: p50 {percentiles[49] * 1000:.1f}, '
+            f'p95 {percentiles[94] * 1000:.1f}, p99 {percentiles[98] * 1000:.1f}'
+        )
+
+    @staticmethod
+    def run_connection(host: str, paths: list[str], requests_count: int, cart_product: int) -> tuple[list[float], int]:
+        """ Returns latencies of requests and count of error responses """
+        connection = client.HTTPConnection(host, timeout=60)
+        session_cookies = cookies.SimpleCookie()
+        latencies = []
+        errors = 0
+        for i in range(requests_count):
+            headers = {}
+            if session_cookies:
+                headers['Cookie'] = '; '.join(
+                    f'{name}={morsel.value}' for name, morsel in session_cookies.items()
+                )
+            # Cart is updated once connection got CSRF cookie from catalogue page
+            if cart_product and i % 2 and 'csrftoken' in session_cookies:
+                method, path = 'POST', reverse('update_cart_page')
+                body = json.dumps({'productId': cart_product, 'action': 'add_to_cart'})
+                headers['Content-Type'] = 'application/json'
+                headers['X-CSRFToken'] = session_cookies['csrftoken'].value
+            else:
+                method, path, body = 'GET', paths[i % len(paths)], None
+
+            start = time.perf_counter()
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+            except (ConnectionError, client.HTTPException):
+                # Restarted server worker drops its keep-alive connections,
+                # next request is sent over a new one
+                connection.close()
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+            if response.status >= 400:
+                errors += 1
+            for cookie in response.headers.get_all('Set-Cookie') or ():
+                session_cookies.load(cookie)
+        connection.close()
+        return latencies, errors
@@ -0,0 +1,99 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.template import engines
+from django.test import Client
+
+from shop import utils
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures startup time and time of requests handled in process, '
+        'without HTTP server, in current settings profile. Run it with '
+        'DJANGO_ENV=dev, test and prod to compare their overhead. '
+        'Shop templates compiling, done on startup, is measured separately'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths',
+            nargs='+',
+            help='Requested paths',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Number of requests to each path',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'Profile: {settings.DJANGO_ENV}, DEBUG: {settings.DEBUG}, '
+            f'startup: {self.measure_startup() * 1000:.0f} ms'
+        )
+        templates_count, compiling_time = self.measure_templates_compiling()
+        self.stdout.write(f'Shop templates: {templates_count} compiled in {compiling_time * 1000:.1f} ms')
+        client = Client(HTTP_HOST=self.get_host())
+        for path in options['paths']:
+            # The first request fills caches, so it's reported separately
+            start = time.perf_counter()
+            client.get(path)
+            first_latency = time.perf_counter() - start
+            latencies = []
+            for _ in range(options['requests']):
+                start = time.perf_counter()
+                response = client.get(path)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code >= 400:
+                    raise CommandError(f'{path}: response status {response.status_code}')
+            percentiles = statistics.quantiles(latencies, n=100)
+            self.stdout.write(
+                f'{path}: first {first_latency * 1000:.2f} ms, '
+                f'mean {statistics.mean(latencies) * 1000:.2f} ms, '
+                f'p50 {percentiles[49] * 1000:.2f} ms, p99 {percentiles[98] * 1000:.2f} ms, '
+                f'SQL queries recorded: {len(connection.queries)}'
+            )
+
+    @staticmethod
+    def measure_startup() -> float:
+        """ Best of three times of WSGI application loading in new process """
+        times = []
+        for _ in range(3):
+            start = time.perf_counter()
+            subprocess.run(
+                [
+                    sys.executable,
+                    '-c',
+                    'from django.core.wsgi import get_wsgi_application; get_wsgi_application()',
+                ],
+                cwd=settings.BASE_DIR,
+                env=os.environ,
+                check=True,
+            )
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    @staticmethod
+    def measure_templates_compiling() -> tuple[int, float]:
+        """ Returns number of shop templates and time to compile them without cache """
+        for loader in engines['django'].engine.template_loaders:
+            loader.reset()
+        start = time.perf_counter()
+        templates_count = utils.compile_templates()
+        return templates_count, time.perf_counter() - start
+
+    @staticmethod
+    def get_host() -> str:
+        """ Host passing ALLOWED_HOSTS check """
+        for host in settings.ALLOWED_HOSTS:
+            if host != '*':
+                return host.lstrip('.')
+        return 'localhost'
@@ -0,0 +1,65 @@
+import os
+
+import rcssmin
+import rjsmin
+from django.apps import apps
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand, CommandError
+
+from shop import config
+
+
+MINIFIERS = {
+    '.css': lambda source: rcssmin.cssmin(source, keep_bang_comments=True),
+    '.js': lambda source: rjsmin.jsmin(source, keep_bang_comments=True),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Concatenates and minifies shop CSS and JS into bundles in shop/static. '
+        'Hashed names and gzip/brotli variants are made by collectstatic'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Fail if bundles are not up to date instead of writing them',
+        )
+
+    def handle(self, *args, **options):
+        outdated = []
+        for bundle_name, source_names in config.STATIC_BUNDLES.items():
+            bundle = self.build_bundle(bundle_name, source_names)
+            bundle_path = os.path.join(apps.get_app_config('shop').path, 'static', bundle_name)
+            current = ''
+            if os.path.exists(bundle_path):
+                with open(bundle_path, encoding='utf-8') as bundle_file:
+                    current = bundle_file.read()
+            if current == bundle:
+                continue
+
+            outdated.append(bundle_name)
+            if not options['check']:
+                os.makedirs(os.path.dirname(bundle_path), exist_ok=True)
+                with open(bundle_path, 'w', encoding='utf-8') as bundle_file:
+                    bundle_file.write(bundle)
+                self.stdout.write(f'{bundle_name}: {len(bundle.encode())} bytes')
+
+        if options['check'] and outdated:
+            raise CommandError(f'Outdated bundles: {", ".join(outdated)}, run build_assets')
+
+    @staticmethod
+    def build_bundle(bundle_name: str, source_names: tuple[str, ...]) -> str:
+        minify = MINIFIERS[os.path.splitext(bundle_name)[1]]
+        sources = []
+        for source_name in source_names:
+            source_path = finders.find(source_name)
+            if source_path is None:
+                raise CommandError(f'Static file {source_name} not found')
+            with open(source_path, encoding='utf-8') as source_file:
+                sources.append(minify(source_file.read()))
+        # Semicolons keep concatenated scripts apart
+        separator = ';\n' if bundle_name.endswith('.js') else '\n'
+        return separator.join(sources) + '\n'
@@ -0,0 +1,114 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from shop import storage, utils
+from shop.models import CablePhoto, CableType
+
+
+class Command(BaseCommand):
+    help = (
+        'Renames photos uploaded before ContentHashStorage to content hash names '
+        'and updates their paths in database. Old files are kept, as pages cached '
+        'by browsers may still refer to them, run with --delete-old later to delete them'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only show new names or files to delete',
+        )
+        parser.add_argument(
+            '--delete-old',
+            action='store_true',
+            help='Delete old files not used anymore instead of renaming',
+        )
+
+    def handle(self, *args, **options):
+        if options['delete_old']:
+            self.delete_old_files(options['dry_run'])
+        else:
+            self.rename_files(options['dry_run'])
+
+    def rename_files(self, dry_run: bool) -> None:
+        # The same file may be used by several rows
+        new_names = {}
+        updated = 0
+        with transaction.atomic():
+            for model in (CablePhoto, CableType):
+                photo_storage = model.photo.field.storage
+                photo_owners = []
+                for photo_owner in model.objects.exclude(photo='').exclude(photo__isnull=True):
+                    old_name = photo_owner.photo.name
+                    if storage.is_hashed_name(old_name):
+                        continue
+                    if old_name not in new_names:
+                        try:
+                            new_names[old_name] = self.rename(
+                                photo_storage, old_name, model.photo.field.max_length, dry_run
+                            )
+                        except FileNotFoundError:
+                            self.stderr.write(f'{old_name}: file not found')
+                            continue
+                        self.stdout.write(f'{old_name} -> {new_names[old_name]}')
+
+                    photo_owner.photo = new_names[old_name]
+                    # Image URLs are changed, so pages ETag and Last-Modified must change too
+                    photo_owner.updated_at = timezone.now()
+                    if photo_owner.photo_variants:
+                        photo_owner.photo_variants['source'] = new_names[old_name]
+                    photo_owners.append(photo_owner)
+
+                if not dry_run:
+                    updated += model.objects.bulk_update(
+                        photo_owners, ('photo', 'photo_variants', 'updated_at'), batch_size=500
+                    )
+
+        if updated:
+            utils.bump_catalogue_version()
+        self.stdout.write(f'Files renamed: {len(new_names)}, rows updated: {updated}')
+
+    def delete_old_files(self, dry_run: bool) -> None:
+        """ Deletes not hashed files which are not used by any row and have a hashed copy """
+        used_names = set()
+        # Uploads directories of models, they may share one
+        directories = {}
+        for model in (CablePhoto, CableType):
+            used_names.update(model.objects.values_list('photo', flat=True))
+            field = model.photo.field
+            directories[field.upload_to.split('/')[0]] = (field.storage, field.max_length)
+
+        deleted = 0
+        for directory, (photo_storage, max_length) in directories.items():
+            for name in self.walk(photo_storage, directory):
+                if storage.is_hashed_name(name) or name in used_names:
+                    continue
+                with photo_storage.open(name, 'rb') as photo_file:
+                    hashed_name = storage.get_hashed_name(name, photo_file, max_length)
+                if not photo_storage.exists(hashed_name):
+                    continue
+                self.stdout.write(f'{name}: old copy of {hashed_name}')
+                if not dry_run:
+                    photo_storage.delete(name)
+                deleted += 1
+        self.stdout.write(f'Old files deleted: {deleted}')
+
+    @staticmethod
+    def rename(photo_storage, name: str, max_length: int, dry_run: bool) -> str:
+        """ Copies file to content hash name, old file is kept """
+        with photo_storage.open(name, 'rb') as photo_file:
+            if dry_run:
+                return storage.get_hashed_name(name, photo_file, max_length)
+            return photo_storage.save(name, photo_file, max_length)
+
+    @classmethod
+    def walk(cls, photo_storage, directory: str):
+        """ Names of all files in storage directory and its subdirectories """
+        if not photo_storage.exists(directory):
+            return
+        subdirectories, files = photo_storage.listdir(directory)
+        for file_name in files:
+            yield f'{directory}/{file_name}'
+        for subdirectory in subdirectories:
+            yield from cls.walk(photo_storage, f'{directory}/{subdirectory}')
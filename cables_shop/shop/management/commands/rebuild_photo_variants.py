@@ -0,0 +1,123 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from shop import photo_jobs, utils
+from shop.models import CablePhoto, CableType
+
+
+class Command(BaseCommand):
+    help = (
+        'Builds missing photo variants of all cable photos and cable types '
+        'in a pool of processes. Variants with matching content hash are skipped. '
+        'Saved bytes are counted for the widest variant served instead of original'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=os.cpu_count(),
+            help='Number of pool processes',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only count variants to build',
+        )
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Check that variants files are intact instead of building them',
+        )
+
+    def handle(self, *args, **options):
+        photos = [
+            (photo_owner, photo_owner.photo.name)
+            for model in (CablePhoto, CableType)
+            for photo_owner in model.objects.exclude(photo='').exclude(photo__isnull=True)
+        ]
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=options['processes'], initializer=django.setup) as executor:
+            if options['verify']:
+                failed = self.verify(executor, photos)
+            else:
+                failed = self.rebuild(executor, photos, options['dry_run'])
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(
+            f'Photos: {len(photos)} in {elapsed:.1f} s, '
+            f'{len(photos) / max(elapsed, 0.001):.1f} images/s'
+        )
+        if failed:
+            raise CommandError(f'Failed photos: {failed}')
+
+    def rebuild(self, executor, photos: list, dry_run: bool) -> int:
+        futures = {
+            executor.submit(
+                photo_jobs.rebuild_variants, photo_owner._meta.label, photo_name, dry_run
+            ): (photo_owner, photo_name)
+            for photo_owner, photo_name in photos
+        }
+        created = skipped = source_size = served_size = updated = failed = 0
+        for future in as_completed(futures):
+            photo_owner, photo_name = futures[future]
+            try:
+                build = future.result()
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f'{photo_name}: {error!r}')
+                continue
+
+            created += build.created
+            skipped += build.skipped
+            source_size += build.source_size
+            served_size += build.served_size
+            if build.created:
+                self.stdout.write(f'{photo_name}: {build.created} variants')
+            if not dry_run and build.variants != photo_owner.photo_variants:
+                updated += type(photo_owner).objects.filter(
+                    pk=photo_owner.pk, photo=photo_name
+                ).update(photo_variants=build.variants, updated_at=timezone.now())
+
+        if updated:
+            utils.bump_catalogue_version()
+        if dry_run:
+            self.stdout.write(f'Variants to build: {created}, up to date: {skipped}')
+        else:
+            self.stdout.write(
+                f'Variants built: {created}, up to date: {skipped}, photos updated: {updated}'
+            )
+            self.stdout.write(
+                f'Originals: {source_size / 2 ** 20:.1f} MiB, '
+                f'widest variants: {served_size / 2 ** 20:.1f} MiB, '
+                f'saved: {(source_size - served_size) / 2 ** 20:.1f} MiB'
+            )
+        return failed
+
+    def verify(self, executor, photos: list) -> int:
+        futures = {
+            executor.submit(
+                photo_jobs.verify_variants,
+                photo_owner._meta.label,
+                photo_name,
+                photo_owner.photo_variants,
+            ): photo_name
+            for photo_owner, photo_name in photos
+        }
+        failed = 0
+        for future in as_completed(futures):
+            photo_name = futures[future]
+            try:
+                problems = future.result()
+            except Exception as error:
+                problems = [repr(error)]
+            if problems:
+                failed += 1
+                self.stderr.write(f'{photo_name}: {"; ".join(problems)}')
+        self.stdout.write(f'Photos with broken variants: {failed}')
+        return failed
@@ -0,0 +1,88 @@
+import os
+import time
+from concurrent.futures import (Executor, ProcessPoolExecutor,
+                                ThreadPoolExecutor, as_completed)
+
+import django
+from django.core.management.base import BaseCommand
+
+from shop import photo_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        'Processes queued photo variants jobs in a pool of processes, '
+        'failed jobs are retried with growing delay'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=os.cpu_count(),
+            help='Number of pool processes, 0 to process jobs in the worker itself',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=5.0,
+            help='Seconds to wait for new jobs when queue is empty',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit when there are no pending jobs',
+        )
+
+    def handle(self, *args, **options):
+        requeued = photo_jobs.requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(f'Stale jobs returned to queue: {requeued}')
+
+        self.done = self.failed = 0
+        with self.get_executor(options['processes']) as executor:
+            try:
+                while True:
+                    jobs = photo_jobs.claim_jobs(limit=max(options['processes'], 1) * 2)
+                    if jobs:
+                        self.process_jobs(executor, jobs)
+                    elif options['once']:
+                        break
+                    else:
+                        time.sleep(options['poll_interval'])
+            except KeyboardInterrupt:
+                self.stdout.write('Stopped')
+        self.stdout.write(f'Jobs done: {self.done}, failed attempts: {self.failed}')
+
+    @staticmethod
+    def get_executor(processes: int) -> Executor:
+        if not processes:
+            return ThreadPoolExecutor(max_workers=1)
+        # Pool processes only work with files and never use
+        # database connection inherited from the worker
+        return ProcessPoolExecutor(max_workers=processes, initializer=django.setup)
+
+    def process_jobs(self, executor: Executor, jobs: list) -> None:
+        futures = {}
+        for job in jobs:
+            photo = job.photo_owner.photo
+            if not photo:
+                photo_jobs.complete_job(job, '', {})
+                continue
+            future = executor.submit(
+                photo_jobs.make_variants, job.photo_owner._meta.label, photo.name
+            )
+            futures[future] = (job, photo.name)
+
+        for future in as_completed(futures):
+            job, photo_name = futures[future]
+            try:
+                variants = future.result()
+            except Exception as error:
+                photo_jobs.fail_job(job, repr(error))
+                self.failed += 1
+                self.stderr.write(f'{job}, attempt {job.attempts}: {error!r}')
+            else:
+                photo_jobs.complete_job(job, photo_name, variants)
+                self.done += 1
+                self.stdout.write(f'{job}: {photo_name}')
@@ -0,0 +1,14 @@
+from django.http import HttpRequest
+from django.utils.deprecation import MiddlewareMixin
+
+from . import utils
+
+
+class CartMiddleware(MiddlewareMixin):
+    """
+    Adds lazy request.cart with customer IN_CART order,
+    so it's queried only once per request
+    """
+
+    def process_request(self, request: HttpRequest) -> None:
+        utils.set_lazy_cart(request)
@@ -0,0 +1,54 @@
+# Generated by Django 4.0.6 on 2026-10-18 08:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_cart_summary(apps, schema_editor):
+    Order = apps.get_model('shop', 'Order')
+    OrderedProduct = apps.get_model('shop', 'OrderedProduct')
+
+    orders = {}
+    for ordered_product in OrderedProduct.objects.select_related('product'):
+        order = orders.setdefault(
+            ordered_product.order_id,
+            Order(pk=ordered_product.order_id, items_total=0, price_total=0),
+        )
+        order.items_total += ordered_product.quantity
+        order.price_total += ordered_product.quantity * ordered_product.product.price
+    Order.objects.bulk_update(orders.values(), ['items_total', 'price_total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0003_remove_order_order_last_update_date'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+            ],
+        ),
+        migrations.RemoveField(
+            model_name='cabletype',
+            name='slug',
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='items_total',
+            field=models.PositiveIntegerField(default=0, verbose_name='количество товаров'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='price_total',
+            field=models.PositiveIntegerField(default=0, verbose_name='стоимость товаров, руб.'),
+        ),
+        migrations.AlterField(
+            model_name='cable',
+            name='type',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='shop.cabletype', verbose_name='тип кабеля'),
+        ),
+        migrations.RunPython(fill_cart_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.0.6 on 2026-10-18 08:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_catalogue_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cable',
+            index=models.Index(condition=models.Q(('is_for_sale', True)), fields=['type', 'price', 'id'], name='cable_for_sale_ordering_idx'),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 4.0.6 on 2026-10-18 09:20
+
+import re
+
+import django.contrib.postgres.search
+import snowballstemmer
+from django.db import migrations
+
+
+# Search index as it was made by this migration, later changes of shop.search
+# must not change it
+FTS_TABLE = 'shop_cable_fts'
+
+
+def stem_words(text):
+    words = re.findall(r'\w+', text.lower().replace('ё', 'е'))
+    return snowballstemmer.stemmer('russian').stemWords(words)
+
+
+def create_search_index(apps, schema_editor):
+    Cable = apps.get_model('shop', 'Cable')
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX cable_search_vector_idx '
+            'ON shop_cable USING gin (search_vector)'
+        )
+        schema_editor.execute(
+            "UPDATE shop_cable SET search_vector = "
+            "setweight(to_tsvector('russian', COALESCE(shop_cable.name, '')), 'A') "
+            "|| setweight(to_tsvector('russian', COALESCE("
+            "(SELECT shop_cabletype.name FROM shop_cabletype "
+            "WHERE shop_cabletype.id = shop_cable.type_id), '')), 'A') "
+            "|| setweight(to_tsvector('russian', COALESCE(shop_cable.description, '')), 'B')"
+        )
+        return
+
+    schema_editor.execute(
+        f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(title, description)'
+    )
+    rows = [
+        (
+            cable.pk,
+            ' '.join(stem_words(f'{cable.name} {cable.type.name}')),
+            ' '.join(stem_words(cable.description or '')),
+        )
+        for cable in Cable.objects.select_related('type')
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description) VALUES (%s, %s, %s)',
+            rows
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX cable_search_vector_idx')
+    else:
+        schema_editor.execute(f'DROP TABLE {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0006_cable_for_sale_ordering_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cable',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.0.6 on 2026-10-18 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0007_cable_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cablephoto',
+            name='photo_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='варианты фото'),
+        ),
+        migrations.AddField(
+            model_name='cabletype',
+            name='photo_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='варианты фото'),
+        ),
+    ]
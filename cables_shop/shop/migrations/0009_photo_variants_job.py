@@ -0,0 +1,56 @@
+# Generated by Django 4.0.6 on 2026-10-18 10:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def queue_existing_photos(apps, schema_editor):
+    CablePhoto = apps.get_model('shop', 'CablePhoto')
+    CableType = apps.get_model('shop', 'CableType')
+    PhotoVariantsJob = apps.get_model('shop', 'PhotoVariantsJob')
+    PhotoVariantsJob.objects.bulk_create(
+        [PhotoVariantsJob(cable_photo=photo) for photo in CablePhoto.objects.exclude(photo='')]
+        + [
+            PhotoVariantsJob(cable_type=cable_type)
+            for cable_type in CableType.objects.exclude(photo='').exclude(photo__isnull=True)
+        ]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0008_photo_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhotoVariantsJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('PE', 'В очереди'), ('RU', 'Выполняется'), ('DO', 'Выполнено'), ('FA', 'Ошибка')], default='PE', max_length=2, verbose_name='статус')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='попыток')),
+                ('error', models.TextField(blank=True, verbose_name='ошибка')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='выполнить после')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='время создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='время изменения')),
+                ('cable_photo', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='shop.cablephoto', verbose_name='фото кабеля')),
+                ('cable_type', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='shop.cabletype', verbose_name='тип кабеля')),
+            ],
+            options={
+                'verbose_name': 'задача обработки фото',
+                'verbose_name_plural': 'задачи обработки фото',
+                'ordering': ('-pk',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='photovariantsjob',
+            index=models.Index(fields=['status', 'run_after'], name='photo_job_queue_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='photovariantsjob',
+            constraint=models.CheckConstraint(check=models.Q(models.Q(('cable_photo__isnull', False), ('cable_type__isnull', True)), models.Q(('cable_photo__isnull', True), ('cable_type__isnull', False)), _connector='OR'), name='photo_job_has_one_photo'),
+        ),
+        migrations.RunPython(queue_existing_photos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.0.6 on 2026-10-18 09:28
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_lines(apps, schema_editor):
+    """ Quantities of the same product in order are summed in its first line """
+    OrderedProduct = apps.get_model('shop', 'OrderedProduct')
+
+    duplicates = (
+        OrderedProduct.objects.values('order', 'product')
+        .annotate(lines_count=Count('pk'), first_pk=Min('pk'), total_quantity=Sum('quantity'))
+        .filter(lines_count__gt=1)
+    )
+    for duplicate in duplicates:
+        lines = OrderedProduct.objects.filter(order=duplicate['order'], product=duplicate['product'])
+        lines.filter(pk=duplicate['first_pk']).update(quantity=duplicate['total_quantity'])
+        lines.exclude(pk=duplicate['first_pk']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0009_photo_variants_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_lines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='orderedproduct',
+            constraint=models.UniqueConstraint(fields=('order', 'product'), name='ordered_product_unique_line'),
+        ),
+    ]
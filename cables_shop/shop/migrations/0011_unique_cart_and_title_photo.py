@@ -0,0 +1,84 @@
+# Generated by Django 4.0.6 on 2026-10-18 09:32
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min, Sum
+
+
+def merge_duplicate_carts(apps, schema_editor):
+    """ Lines of extra carts are moved to the first cart of customer """
+    Order = apps.get_model('shop', 'Order')
+    OrderedProduct = apps.get_model('shop', 'OrderedProduct')
+
+    duplicates = (
+        Order.objects.filter(status='IC').values('customer')
+        .annotate(carts_count=Count('pk'), first_pk=Min('pk'))
+        .filter(carts_count__gt=1)
+    )
+    for duplicate in duplicates:
+        extra_carts = Order.objects.filter(
+            customer=duplicate['customer'],
+            status='IC',
+        ).exclude(pk=duplicate['first_pk'])
+        quantities = {}
+        for ordered_product in OrderedProduct.objects.filter(
+                order__customer=duplicate['customer'], order__status='IC',
+        ):
+            quantities[ordered_product.product_id] = (
+                quantities.get(ordered_product.product_id, 0) + ordered_product.quantity
+            )
+        # Lines are deleted along with carts
+        extra_carts.delete()
+
+        for product_id, quantity in quantities.items():
+            OrderedProduct.objects.update_or_create(
+                order_id=duplicate['first_pk'],
+                product_id=product_id,
+                defaults={'quantity': quantity},
+            )
+        totals = OrderedProduct.objects.filter(order_id=duplicate['first_pk']).aggregate(
+            items_total=Sum('quantity'),
+            price_total=Sum(
+                F('quantity') * F('product__price'),
+                output_field=models.IntegerField(),
+            ),
+        )
+        Order.objects.filter(pk=duplicate['first_pk']).update(
+            items_total=totals['items_total'] or 0,
+            price_total=totals['price_total'] or 0,
+        )
+
+
+def keep_first_title_photo(apps, schema_editor):
+    """ Cable title photo is the first one, as Cable.title_photo shows """
+    CablePhoto = apps.get_model('shop', 'CablePhoto')
+
+    duplicates = (
+        CablePhoto.objects.filter(is_title=True).values('cable')
+        .annotate(titles_count=Count('pk'), first_pk=Min('pk'))
+        .filter(titles_count__gt=1)
+    )
+    for duplicate in duplicates:
+        CablePhoto.objects.filter(
+            cable=duplicate['cable'],
+            is_title=True,
+        ).exclude(pk=duplicate['first_pk']).update(is_title=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0010_ordered_product_unique_line'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_carts, migrations.RunPython.noop),
+        migrations.RunPython(keep_first_title_photo, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cablephoto',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_title', True)), fields=('cable',), name='cable_photo_one_title'),
+        ),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'IC')), fields=('customer',), name='order_one_cart_per_customer'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.0.6 on 2026-10-18 10:55
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0011_unique_cart_and_title_photo'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='order',
+            name='price_total',
+        ),
+    ]
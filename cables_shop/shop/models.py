@@ -1,10 +1,20 @@
+from typing import Union
+
 from django.contrib.auth.models import (AbstractBaseUser, BaseUserManager,
                                         PermissionsMixin)
+from django.contrib.postgres.search import SearchVectorField
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import (Exists, F, OuterRef, Prefetch, Q, Subquery,
+                              Sum)
+from django.db.models.fields.files import FieldFile
+from django.db.models.functions import Coalesce
 from django.urls import reverse
+from django.utils import timezone
 from phonenumber_field.modelfields import PhoneNumberField
 
 from shop import config
+from shop.images import ResponsivePhoto
 
 
 class CableType(models.Model):
@@ -21,6 +31,8 @@ class CableType(models.Model):
         null=True,
         blank=True,
     )
+    photo_variants = models.JSONField('варианты фото', default=dict, blank=True, editable=False)
+    updated_at = models.DateTimeField('время изменения', auto_now=True, db_index=True)
 
     class Meta:
         verbose_name = 'тип кабеля'
@@ -35,6 +47,46 @@ class CableType(models.Model):
         """Get photo URL or empty string"""
         return self.photo.url if self.photo else ''
 
+    @property
+    def responsive_photo(self) -> ResponsivePhoto:
+        return ResponsivePhoto(self.photo, self.photo_variants)
+
+
+class CableQuerySet(models.QuerySet):
+    def with_title_photo(self):
+        """
+        Annotate cables with their title photo path and variants,
+        so title_photo_url doesn't query photos for each cable
+        """
+        title_photo = CablePhoto.objects.filter(
+            cable=OuterRef('pk'),
+            is_title=True,
+        ).order_by()
+        return self.annotate(
+            title_photo_path=Subquery(title_photo.values('photo')[:1]),
+            title_photo_variants=Subquery(
+                title_photo.values('photo_variants')[:1],
+                output_field=models.JSONField(),
+            ),
+        )
+
+    def for_sale(self):
+        """ Cables for sale having title photo to display on cable card """
+        return self.filter(is_for_sale=True).filter(
+            Exists(CablePhoto.objects.filter(cable=OuterRef('pk'), is_title=True))
+        )
+
+    def after(self, type_id: int, price: int, pk: int):
+        """
+        Keyset pagination: cables following the given one
+        in ('type_id', 'price', 'pk') order
+        """
+        return self.filter(type__gte=type_id).filter(
+            Q(type__gt=type_id)
+            | Q(type=type_id, price__gt=price)
+            | Q(type=type_id, price=price, pk__gt=pk)
+        )
+
 
 class Cable(models.Model):
     """Model representing  cable (products in this store)"""
@@ -50,11 +102,24 @@ class Cable(models.Model):
         verbose_name='тип кабеля',
         on_delete=models.PROTECT,
     )
+    updated_at = models.DateTimeField('время изменения', auto_now=True, db_index=True)
+    # Filled on PostgreSQL only, see shop.search
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = CableQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'кабель'
         verbose_name_plural = 'кабели'
         ordering = ('type', 'price')
+        indexes = (
+            # All cables page keyset pagination
+            models.Index(
+                fields=('type', 'price', 'id'),
+                condition=Q(is_for_sale=True),
+                name='cable_for_sale_ordering_idx',
+            ),
+        )
 
     def __str__(self):
         return f'{self.name}, {self.length_sm} см.'
@@ -64,7 +129,14 @@ class Cable(models.Model):
 
     @property
     def title_photo_url(self) -> str:
-        """Get photo URL or empty string"""
+        """
+        Get photo URL or empty string.
+        Uses path annotated by CableQuerySet.with_title_photo if available
+        """
+        if hasattr(self, 'title_photo_path'):
+            if not self.title_photo_path:
+                return ''
+            return CablePhoto.photo.field.storage.url(self.title_photo_path)
         try:
             return CablePhoto.objects.get(
                 cable=self,
@@ -73,6 +145,20 @@ class Cable(models.Model):
         except CablePhoto.DoesNotExist:
             return ''
 
+    @property
+    def title_photo(self) -> ResponsivePhoto:
+        """
+        Title photo with its variants.
+        Uses annotations of CableQuerySet.with_title_photo if available
+        """
+        if hasattr(self, 'title_photo_path'):
+            photo = FieldFile(None, CablePhoto.photo.field, self.title_photo_path)
+            return ResponsivePhoto(photo, self.title_photo_variants)
+        title_photo = CablePhoto.objects.filter(cable=self, is_title=True).first()
+        if title_photo is None:
+            return ResponsivePhoto(None, None)
+        return title_photo.responsive_photo
+
 
 class CablePhoto(models.Model):
     """
@@ -80,25 +166,112 @@ class CablePhoto(models.Model):
     Title photo is the one displayed on cable card on all cables page
     """
     photo = models.ImageField('фото', upload_to='photos/cable_photos/%Y/%m')
+    photo_variants = models.JSONField('варианты фото', default=dict, blank=True, editable=False)
     cable = models.ForeignKey(
         Cable, verbose_name='кабель',
         on_delete=models.CASCADE,
     )
     is_title = models.BooleanField('является титульным')
+    updated_at = models.DateTimeField('время изменения', auto_now=True, db_index=True)
 
     class Meta:
         verbose_name = 'фото'
         verbose_name_plural = 'фотографии'
         ordering = ('pk', '-is_title')
+        constraints = (
+            # Also serves title photo lookups of CableQuerySet
+            models.UniqueConstraint(
+                fields=('cable',),
+                condition=Q(is_title=True),
+                name='cable_photo_one_title',
+            ),
+        )
 
     def __str__(self):
         return f'{"title " if self.is_title else ""}{self.cable.name[:5]}...'
 
+    def clean(self):
+        """ Partial unique constraints are not validated by Django 4.0 forms """
+        if not self.is_title:
+            return
+        other_titles = CablePhoto.objects.filter(
+            cable_id=self.cable_id,
+            is_title=True,
+        ).exclude(pk=self.pk)
+        if other_titles.exists():
+            raise ValidationError({'is_title': 'У кабеля уже есть титульное фото'})
+
     @property
     def photo_url(self) -> str:
         """Get photo URL or empty string"""
         return self.photo.url if self.photo else ''
 
+    @property
+    def responsive_photo(self) -> ResponsivePhoto:
+        return ResponsivePhoto(self.photo, self.photo_variants)
+
+
+class PhotoVariantsJob(models.Model):
+    """
+    Queued generation of photo variants for cable photo or cable type,
+    processed by run_image_worker command
+    """
+    class JobStatus(models.TextChoices):
+        PENDING = 'PE', 'В очереди'
+        RUNNING = 'RU', 'Выполняется'
+        DONE = 'DO', 'Выполнено'
+        FAILED = 'FA', 'Ошибка'
+
+    cable_photo = models.ForeignKey(
+        CablePhoto,
+        verbose_name='фото кабеля',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+    )
+    cable_type = models.ForeignKey(
+        CableType,
+        verbose_name='тип кабеля',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+    )
+    status = models.CharField(
+        'статус',
+        max_length=2,
+        choices=JobStatus.choices,
+        default=JobStatus.PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField('попыток', default=0)
+    error = models.TextField('ошибка', blank=True)
+    run_after = models.DateTimeField('выполнить после', default=timezone.now)
+    created_at = models.DateTimeField('время создания', auto_now_add=True)
+    updated_at = models.DateTimeField('время изменения', auto_now=True)
+
+    class Meta:
+        verbose_name = 'задача обработки фото'
+        verbose_name_plural = 'задачи обработки фото'
+        ordering = ('-pk',)
+        indexes = (
+            models.Index(fields=('status', 'run_after'), name='photo_job_queue_idx'),
+        )
+        constraints = (
+            models.CheckConstraint(
+                check=(
+                    Q(cable_photo__isnull=False, cable_type__isnull=True)
+                    | Q(cable_photo__isnull=True, cable_type__isnull=False)
+                ),
+                name='photo_job_has_one_photo',
+            ),
+        )
+
+    def __str__(self):
+        return f'#{self.pk}, {self.photo_owner}, {self.get_status_display()}'
+
+    @property
+    def photo_owner(self) -> Union[CablePhoto, CableType]:
+        return self.cable_photo or self.cable_type
+
 
 class CustomUserManager(BaseUserManager):
     """
@@ -196,6 +369,23 @@ class ShippingAddress(models.Model):
         return f'Адрес покупателя {self.customer}, {self.zipcode}'
 
 
+class OrderQuerySet(models.QuerySet):
+    def with_totals(self):
+        """
+        Annotate orders with products total price,
+        calculated by database for all orders in one query
+        """
+        return self.annotate(
+            products_price_sum=Coalesce(
+                Sum(
+                    F('orderedproduct__quantity') * F('orderedproduct__product__price'),
+                    output_field=models.IntegerField(),
+                ),
+                0,
+            )
+        )
+
+
 class Order(models.Model):
     class OrderStatus(models.TextChoices):
         IN_CART = 'IC', 'В корзине'
@@ -234,10 +424,24 @@ class Order(models.Model):
         choices=DeliveryType.choices,
         default=DeliveryType.DELIVERY
     )
+    # Cart summary, updated on every cart change by
+    # utils.update_cart_summary. Price total isn't stored, as cable prices
+    # change, it's calculated by OrderQuerySet.with_totals
+    items_total = models.PositiveIntegerField('количество товаров', default=0)
+
+    objects = OrderQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'заказ'
         verbose_name_plural = 'заказы'
+        constraints = (
+            # Cart lookup of CartMiddleware, 'IC' is OrderStatus.IN_CART
+            models.UniqueConstraint(
+                fields=('customer',),
+                condition=Q(status='IC'),
+                name='order_one_cart_per_customer',
+            ),
+        )
 
     def __str__(self):
         return f'№{self.pk}: {self.customer}, {self.get_status_display()}'
@@ -247,16 +451,13 @@ class Order(models.Model):
 
     @property
     def products_total_price(self) -> int:
-        """ Returns total price for all products in cart """
-        ordered_products = self.orderedproduct_set.select_related('product').values(
-            'quantity',
-            'product__price'
-        )
-
-        prices = []
-        for product in ordered_products:
-            prices.append(product['quantity'] * product['product__price'])
-        return sum(prices)
+        """
+        Returns total price for all products in cart.
+        Uses sum annotated by OrderQuerySet.with_totals if available
+        """
+        if hasattr(self, 'products_price_sum'):
+            return self.products_price_sum
+        return self.orderedproduct_set.total_price()
 
     @property
     def order_total_price(self) -> int:
@@ -269,6 +470,24 @@ class Order(models.Model):
         return self.products_total_price
 
 
+class OrderedProductQuerySet(models.QuerySet):
+    def with_product_title_photo(self):
+        """Prefetch ordered cables along with their title photo paths"""
+        return self.prefetch_related(
+            Prefetch('product', queryset=Cable.objects.with_title_photo())
+        )
+
+    def total_price(self) -> int:
+        """Total price of all products in queryset, calculated by database"""
+        total_price = self.aggregate(
+            total_price=Sum(
+                F('quantity') * F('product__price'),
+                output_field=models.IntegerField(),
+            )
+        )['total_price']
+        return total_price or 0
+
+
 class OrderedProduct(models.Model):
     order = models.ForeignKey(
         Order,
@@ -283,9 +502,18 @@ class OrderedProduct(models.Model):
     quantity = models.SmallIntegerField('заказанное количество', default=0)
     date_added = models.DateTimeField('время добавления', auto_now_add=True)
 
+    objects = OrderedProductQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'заказанный товар'
         verbose_name_plural = 'заказанные товары'
+        constraints = (
+            # Quantity of product in order is changed only in its one line
+            models.UniqueConstraint(
+                fields=('order', 'product'),
+                name='ordered_product_unique_line',
+            ),
+        )
 
     def __str__(self):
         return f'#{self.order.pk}, {self.product}'
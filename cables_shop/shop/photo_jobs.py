@@ -0,0 +1,131 @@
+"""
+Database backed queue of photo variants jobs.
+Jobs are queued when photo is saved and processed by run_image_worker command
+"""
+from datetime import timedelta
+from typing import Union
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import F
+from django.db.models.fields.files import FieldFile
+from django.utils import timezone
+
+from shop import config
+
+from . import images, utils
+from .models import CablePhoto, CableType, PhotoVariantsJob
+
+
+OWNER_FIELDS = {
+    CablePhoto: 'cable_photo',
+    CableType: 'cable_type',
+}
+
+
+def enqueue_photo_variants(instance: Union[CablePhoto, CableType]) -> None:
+    """ Queue variants generation if photo has changed since variants were made """
+    if not instance.photo:
+        if instance.photo_variants:
+            instance.photo_variants = {}
+            type(instance).objects.filter(pk=instance.pk).update(photo_variants={})
+        return
+    if instance.photo_variants.get('source') == instance.photo.name:
+        return
+
+    owner = {OWNER_FIELDS[type(instance)]: instance}
+    is_queued = PhotoVariantsJob.objects.filter(
+        **owner,
+        status=PhotoVariantsJob.JobStatus.PENDING,
+    ).exists()
+    if not is_queued:
+        PhotoVariantsJob.objects.create(**owner)
+
+
+def requeue_stale_jobs() -> int:
+    """ Return to queue jobs left running by stopped worker """
+    return PhotoVariantsJob.objects.filter(
+        status=PhotoVariantsJob.JobStatus.RUNNING,
+        updated_at__lt=timezone.now() - timedelta(seconds=config.PHOTO_JOB_TIMEOUT),
+    ).update(status=PhotoVariantsJob.JobStatus.PENDING, updated_at=timezone.now())
+
+
+def claim_jobs(limit: int) -> list[PhotoVariantsJob]:
+    """
+    Mark pending jobs as running and return them.
+    Locked rows are skipped, so several workers can share the queue
+    """
+    with transaction.atomic():
+        jobs = list(
+            PhotoVariantsJob.objects.select_for_update(skip_locked=True, of=('self',))
+            .select_related('cable_photo', 'cable_type')
+            .filter(
+                status=PhotoVariantsJob.JobStatus.PENDING,
+                run_after__lte=timezone.now(),
+            )
+            .order_by('run_after', 'pk')[:limit]
+        )
+        PhotoVariantsJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status=PhotoVariantsJob.JobStatus.RUNNING,
+            attempts=F('attempts') + 1,
+            updated_at=timezone.now(),
+        )
+    for job in jobs:
+        job.status = PhotoVariantsJob.JobStatus.RUNNING
+        job.attempts += 1
+    return jobs
+
+
+def get_photo_file(model_label: str, photo_name: str) -> FieldFile:
+    field = apps.get_model(model_label)._meta.get_field('photo')
+    return FieldFile(None, field, photo_name)
+
+
+def complete_job(job: PhotoVariantsJob, photo_name: str, variants: dict) -> None:
+    owner = job.photo_owner
+    with transaction.atomic():
+        # Photo could be replaced while job was running
+        # Image URLs are changed, so pages ETag and Last-Modified must change too
+        type(owner).objects.filter(pk=owner.pk, photo=photo_name).update(
+            photo_variants=variants,
+            updated_at=timezone.now(),
+        )
+        # Job could be deleted along with photo, so it is updated by queryset
+        PhotoVariantsJob.objects.filter(pk=job.pk).update(
+            status=PhotoVariantsJob.JobStatus.DONE,
+            error='',
+            updated_at=timezone.now(),
+        )
+        transaction.on_commit(utils.bump_catalogue_version)
+
+
+def fail_job(job: PhotoVariantsJob, error: str) -> None:
+    """ Retry job later with growing delay or mark it failed after last attempt """
+    job.error = error
+    if job.attempts >= config.PHOTO_JOB_MAX_ATTEMPTS:
+        job.status = PhotoVariantsJob.JobStatus.FAILED
+    else:
+        job.status = PhotoVariantsJob.JobStatus.PENDING
+        job.run_after = timezone.now() + timedelta(
+            seconds=config.PHOTO_JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+        )
+    PhotoVariantsJob.objects.filter(pk=job.pk).update(
+        status=job.status,
+        error=job.error,
+        run_after=job.run_after,
+        updated_at=timezone.now(),
+    )
+
+
+# Functions below run in pool processes, so they only work with files
+
+def make_variants(model_label: str, photo_name: str) -> dict:
+    return images.generate_variants(get_photo_file(model_label, photo_name))
+
+
+def rebuild_variants(model_label: str, photo_name: str, dry_run: bool) -> images.VariantsBuild:
+    return images.build_variants(get_photo_file(model_label, photo_name), dry_run)
+
+
+def verify_variants(model_label: str, photo_name: str, variants: dict) -> list[str]:
+    return images.verify_variants(get_photo_file(model_label, photo_name), variants)
@@ -0,0 +1,108 @@
+"""
+Full-text search for cables by name, description and type name.
+
+On PostgreSQL cables have search_vector column with GIN index,
+built with russian text search configuration.
+On other databases (SQLite for local development) FTS5 table is used
+with words stemmed by snowball russian stemmer.
+Index is updated on catalogue changes by signals
+"""
+import re
+
+import snowballstemmer
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection
+from django.db.models import F, OuterRef, QuerySet, Subquery
+from django.db.models.expressions import RawSQL
+
+from .models import Cable, CableType
+
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'shop_cable_fts'
+
+stemmer = snowballstemmer.stemmer('russian')
+
+
+def stem_words(text: str) -> list[str]:
+    words = re.findall(r'\w+', text.lower().replace('ё', 'е'))
+    return stemmer.stemWords(words)
+
+
+def get_search_vector() -> SearchVector:
+    type_name = Subquery(
+        CableType.objects.filter(pk=OuterRef('type_id')).values('name')[:1]
+    )
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(type_name, weight='A', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def update_cables_index(cables: QuerySet[Cable]) -> None:
+    """ Update search index for given cables """
+    if connection.vendor == 'postgresql':
+        cables.update(search_vector=get_search_vector())
+        return
+
+    rows = [
+        (
+            cable.pk,
+            ' '.join(stem_words(f'{cable.name} {cable.type.name}')),
+            ' '.join(stem_words(cable.description or '')),
+        )
+        for cable in cables.select_related('type')
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+            [(pk,) for pk, *_ in rows]
+        )
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description) VALUES (%s, %s, %s)',
+            rows
+        )
+
+
+def remove_cable_from_index(cable_pk: int) -> None:
+    # Search vector is removed with cable row on PostgreSQL
+    if connection.vendor == 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [cable_pk])
+
+
+def search_cables(query: str) -> QuerySet[Cable]:
+    """
+    Returns cables matching all query words, most relevant first.
+    Queryset is not limited, so it can be filtered before slicing
+    """
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(
+            query,
+            config=SEARCH_CONFIG,
+            search_type='websearch',
+        )
+        return Cable.objects.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-rank', 'pk')
+
+    words = stem_words(query)
+    if not words:
+        return Cable.objects.none()
+    match = ' '.join(f'"{word}"' for word in words)
+    cable_pk = f'"{Cable._meta.db_table}"."{Cable._meta.pk.column}"'
+    # FTS table is queried by cables query itself, so filters and limit
+    # applied to returned queryset are done by the database in one query.
+    # Title matches weigh more, as A and B weights on PostgreSQL
+    return Cable.objects.filter(
+        pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+    ).annotate(
+        rank=RawSQL(
+            f'SELECT bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {cable_pk}',
+            [match],
+        )
+    ).order_by('rank', 'pk')
@@ -1,15 +1,21 @@
 import json
 from enum import Enum
-from typing import NamedTuple, Optional, TypedDict
+from typing import NamedTuple, TypedDict
 
-from django.core.exceptions import ObjectDoesNotExist
-from django.db import IntegrityError
-from django.http import HttpRequest, QueryDict
+from django.contrib.sessions.backends.base import SessionBase
+from django.db import IntegrityError, connection, transaction
+from django.db.models import (Case, F, IntegerField, OuterRef, Q, Subquery,
+                              Sum, Value, When)
+from django.db.models.functions import Now
+from django.http import HttpRequest
+from django.utils import timezone
+
+from shop import config
 
 from . import utils
 from .exceptions import *
 from .forms import UserInformationForm
-from .models import Cable, Order, OrderedProduct, ShippingAddress, User
+from .models import Cable, Order, OrderedProduct, ShippingAddress
 
 
 class CartUpdateAction(Enum):
@@ -18,34 +24,81 @@ class CartUpdateAction(Enum):
     DELETE_FROM_CART = 'delete_from_cart'
 
 
-class CartUpdateParsedData(NamedTuple):
+class CartUpdateOperation(NamedTuple):
+    product_id: int
+    action: CartUpdateAction
+    count: int
+
+
+class CartLine(NamedTuple):
     product_id: int
-    action: str
+    quantity: int
+    total_price: int
+
+
+class CartSummary(NamedTuple):
+    lines: list[CartLine]
+    delivery_price: int
+
+    @property
+    def items_total(self) -> int:
+        return sum(line.quantity for line in self.lines)
+
+    @property
+    def products_total(self) -> int:
+        return sum(line.total_price for line in self.lines)
+
+    @property
+    def total(self) -> int:
+        return self.products_total + self.delivery_price
+
+    def as_json(self) -> dict:
+        return {
+            'lines': [
+                {
+                    'productId': line.product_id,
+                    'quantity': line.quantity,
+                    'totalPrice': line.total_price,
+                }
+                for line in self.lines
+            ],
+            'itemsTotal': self.items_total,
+            'productsTotal': self.products_total,
+            'total': self.total,
+        }
 
 
 class CartUpdateService:
+    """
+    Applies cart operations sent by cart.js. Several clicks are sent as
+    one list of operations and applied in one transaction.
+    Anonymous customers cart is kept in session, see SessionCart
+    """
+
     def __init__(self, request: HttpRequest) -> None:
         self.request = request
 
-    def process_cart_update(self) -> None:
-        parsed_response = self.__parse_json_update_data()
-        order, _ = Order.objects.get_or_create(
-            customer=self.request.user,
-            status=Order.OrderStatus.IN_CART,
-        )
-        ordered_product = self.__get_product_to_update(
-            order,
-            parsed_response.product_id
-        )
-        self.__update_product_quantity_in_cart(
-            ordered_product,
-            parsed_response.action
-        )
-        utils.save_or_delete_ordered_product(ordered_product)
-
-    def __parse_json_update_data(self) -> CartUpdateParsedData:
+    def process_cart_update(self) -> CartSummary:
+        """ Returns state of the whole cart after update """
+        operations = self.__parse_json_update_data()
+        if not self.request.user.is_authenticated:
+            return self.__update_session_cart(operations)
+
+        with transaction.atomic():
+            # Cart is created by the first update.
+            # Locked cart row serializes concurrent updates of the same cart
+            cart_pk = utils.create_empty_cart(self.request.user).pk
+            cart = Order.objects.select_for_update().get(pk=cart_pk)
+            self.__apply_operations(cart, operations)
+            cart_summary = self.__get_cart_summary(cart)
+        # Cart summary has been changed
+        utils.set_lazy_cart(self.request)
+        return cart_summary
+
+    def __parse_json_update_data(self) -> list[CartUpdateOperation]:
         """
         This function is parsing json response from cart.js script.
+        Accepts {"operations": [...]} or a single operation
         """
         try:
             received_data = json.loads(self.request.body)
@@ -54,53 +107,282 @@ class CartUpdateService:
                 'Error during json response decoding'
             )
 
+        if not isinstance(received_data, dict):
+            raise JSONResponseParsingError('Operations object expected')
+        received_operations = received_data.get('operations', [received_data])
+        if not isinstance(received_operations, list) or not received_operations:
+            raise JSONResponseParsingError('Operations list expected')
+        if len(received_operations) > config.CART_UPDATE_MAX_OPERATIONS:
+            raise JSONResponseParsingError('Too many operations')
+
         try:
-            parsed_data = CartUpdateParsedData(
-                product_id=int(received_data.get('productId')),
-                action=received_data.get('action')
-            )
-        except KeyError:
+            operations = [
+                CartUpdateOperation(
+                    product_id=int(operation['productId']),
+                    action=CartUpdateAction(operation['action']),
+                    count=int(operation.get('count', 1)),
+                )
+                for operation in received_operations
+            ]
+        except (KeyError, TypeError, AttributeError):
             raise JSONResponseParsingError(
                 'productId or action is not in response'
             )
+        except ValueError:
+            raise JSONResponseParsingError('Invalid product id, action or count')
+
+        for operation in operations:
+            if operation.product_id < 0 or operation.count < 1:
+                raise JSONResponseParsingError('Invalid product id or count')
+
+        return operations
+
+    @staticmethod
+    def __get_cables(operations: list[CartUpdateOperation], *product_ids: int) -> dict[int, Cable]:
+        """ Cables of operations and of other given ids, which may be missing """
+        operation_product_ids = {operation.product_id for operation in operations}
+        cables = Cable.objects.in_bulk({*operation_product_ids, *product_ids})
+        if not operation_product_ids.issubset(cables):
+            raise CartUpdateError(
+                f'There are no products with ids {operation_product_ids - set(cables)}'
+            )
+        return cables
+
+    @staticmethod
+    def __get_new_quantities(
+            saved_quantities: dict[int, int],
+            cables: dict[int, Cable],
+            operations: list[CartUpdateOperation],
+    ) -> dict[int, int]:
+        """ Quantities of products after operations, in order of operations """
+        quantities = {
+            operation.product_id: saved_quantities.get(operation.product_id, 0)
+            for operation in operations
+        }
+        for operation in operations:
+            quantity = quantities[operation.product_id]
+            match operation.action:
+                case CartUpdateAction.ADD_TO_CART:
+                    units_in_stock = cables[operation.product_id].units_in_stock
+                    if quantity < units_in_stock:
+                        quantity = min(quantity + operation.count, units_in_stock)
+                case CartUpdateAction.REMOVE_FROM_CART:
+                    quantity = max(quantity - operation.count, 0)
+                case CartUpdateAction.DELETE_FROM_CART:
+                    quantity = 0
+            quantities[operation.product_id] = quantity
+        return quantities
+
+    def __update_session_cart(self, operations: list[CartUpdateOperation]) -> CartSummary:
+        """ Nothing is written to database, cables are only read for stock and prices """
+        session_cart = SessionCart(self.request.session)
+        saved_quantities = session_cart.quantities
+        cables = self.__get_cables(operations, *saved_quantities)
+        quantities = saved_quantities | self.__get_new_quantities(
+            saved_quantities, cables, operations
+        )
+        # Cables deleted from catalogue are dropped from cart
+        quantities = {
+            product_id: quantity
+            for product_id, quantity in sorted(quantities.items())
+            if quantity and product_id in cables
+        }
+        session_cart.save(quantities)
+
+        lines = [
+            CartLine(product_id, quantity, quantity * cables[product_id].price)
+            for product_id, quantity in quantities.items()
+        ]
+        return CartSummary(lines, config.DELIVERY_PRICE if lines else 0)
+
+    @staticmethod
+    def __apply_operations(cart: Order, operations: list[CartUpdateOperation]) -> None:
+        """
+        Calculates new quantities of products in cart and saves them
+        with one query per kind of change
+        """
+        cables = CartUpdateService.__get_cables(operations)
+        ordered_products = {
+            ordered_product.product_id: ordered_product
+            for ordered_product in OrderedProduct.objects.filter(
+                order=cart,
+                product_id__in=cables,
+            )
+        }
+        quantities = CartUpdateService.__get_new_quantities(
+            {
+                product_id: ordered_product.quantity
+                for product_id, ordered_product in ordered_products.items()
+            },
+            cables,
+            operations,
+        )
 
-        if parsed_data.product_id < 0:
-            raise JSONResponseParsingError('Invalid product id')
-
-        return parsed_data
+        to_create, to_delete = [], []
+        # Changes of saved quantities by ordered product id
+        deltas = {}
+        quantity_delta = 0
+        for product_id, quantity in quantities.items():
+            ordered_product = ordered_products.get(product_id)
+            saved_quantity = ordered_product.quantity if ordered_product else 0
+            if quantity == saved_quantity:
+                continue
+            quantity_delta += quantity - saved_quantity
+            if ordered_product is None:
+                to_create.append(
+                    OrderedProduct(order=cart, product=cables[product_id], quantity=quantity)
+                )
+            elif quantity == 0:
+                to_delete.append(ordered_product.pk)
+            else:
+                deltas[ordered_product.pk] = quantity - saved_quantity
 
-    def __get_product_to_update(self, order: Order, product_id: int) -> OrderedProduct:
-        """Getting or creating new ordered product for further updating"""
         try:
-            cable = Cable.objects.get(pk=product_id)
-        except ObjectDoesNotExist:
-            raise self.CartUpdateError(
-                f'There is no product with {product_id=}'
+            OrderedProduct.objects.bulk_create(to_create)
+        except IntegrityError:
+            raise CartUpdateError('Product is already in cart')
+        CartUpdateService.__update_quantities(deltas)
+        OrderedProduct.objects.filter(pk__in=to_delete).delete()
+        utils.update_cart_summary(cart.pk, quantity_delta)
+
+    @staticmethod
+    def __update_quantities(deltas: dict[int, int]) -> None:
+        """
+        Shift quantities of ordered products with one UPDATE.
+        Increased quantities are bounded by units in stock in WHERE clause,
+        so if stock has been decreased meanwhile, nothing is updated
+        """
+        if not deltas:
+            return
+        delta = Case(
+            *[When(pk=pk, then=Value(quantity_delta)) for pk, quantity_delta in deltas.items()],
+            output_field=IntegerField(),
+        )
+        decreased = [pk for pk, quantity_delta in deltas.items() if quantity_delta < 0]
+        increased = [pk for pk, quantity_delta in deltas.items() if quantity_delta > 0]
+        # Correlated subquery is evaluated against the row being updated,
+        # so the bound holds even if the row was changed after query start
+        units_in_stock = Subquery(
+            Cable.objects.filter(pk=OuterRef('product_id')).values('units_in_stock')
+        )
+        updated_count = OrderedProduct.objects.filter(
+            Q(pk__in=decreased)
+            | Q(pk__in=increased, quantity__lte=units_in_stock - delta)
+        ).update(quantity=F('quantity') + delta)
+        if updated_count != len(deltas):
+            raise CartUpdateError('Not enough units in stock')
+
+    @staticmethod
+    def __get_cart_summary(cart: Order) -> CartSummary:
+        """
+        Lines of cart with their totals are calculated by one aggregate
+        query, so the summary is consistent with the saved cart
+        """
+        lines = [
+            CartLine(*line)
+            for line in OrderedProduct.objects.filter(order=cart)
+            .values('product_id')
+            .annotate(
+                line_quantity=Sum('quantity'),
+                line_total_price=Sum(
+                    F('quantity') * F('product__price'),
+                    output_field=IntegerField(),
+                ),
             )
+            .values_list('product_id', 'line_quantity', 'line_total_price')
+            .order_by('product_id')
+        ]
+        return CartSummary(
+            lines,
+            delivery_price=(
+                config.DELIVERY_PRICE
+                if lines and cart.delivery_type == Order.DeliveryType.DELIVERY else 0
+            ),
+        )
 
-        ordered_product, _ = OrderedProduct.objects.get_or_create(
-            order=order,
-            product=cable
+
+class SessionCart:
+    """
+    Cart of anonymous customer kept in session as {product id: quantity},
+    so browsing and clicking costs no database writes.
+    It's merged into customer cart on log in
+    """
+
+    def __init__(self, session: SessionBase) -> None:
+        self.session = session
+
+    @property
+    def quantities(self) -> dict[int, int]:
+        # Session is serialized to JSON, so product ids are strings there
+        return {
+            int(product_id): quantity
+            for product_id, quantity in self.session.get(config.SESSION_CART_KEY, {}).items()
+        }
+
+    def save(self, quantities: dict[int, int]) -> None:
+        self.session[config.SESSION_CART_KEY] = {
+            str(product_id): quantity for product_id, quantity in quantities.items()
+        }
+
+    def get_ordered_products(self) -> list[OrderedProduct]:
+        """ Not saved ordered products to display cart page """
+        quantities = self.quantities
+        cables = Cable.objects.with_title_photo().in_bulk(quantities)
+        return [
+            OrderedProduct(product=cables[product_id], quantity=quantity)
+            for product_id, quantity in quantities.items()
+            if product_id in cables
+        ]
+
+    def merge_into(self, cart: Order) -> None:
+        """
+        Add session cart products to customer cart with one upsert,
+        quantities of products already in cart are summed.
+        Quantities above units in stock are corrected on checkout
+        """
+        quantities = self.quantities
+        cables = Cable.objects.in_bulk(quantities)
+        rows = [
+            (cart.pk, product_id, quantity)
+            for product_id, quantity in quantities.items()
+            if product_id in cables
+        ]
+        if rows:
+            with transaction.atomic():
+                # Cart lines are changed only under cart lock, see CartUpdateService
+                list(Order.objects.select_for_update().filter(pk=cart.pk).values_list('pk'))
+                self.__upsert_ordered_products(rows)
+                utils.update_cart_summary(cart.pk, sum(quantity for _, _, quantity in rows))
+        self.session.pop(config.SESSION_CART_KEY, None)
+
+    @staticmethod
+    def __upsert_ordered_products(rows: list[tuple[int, int, int]]) -> None:
+        """
+        INSERT ... ON CONFLICT on (order, product) unique constraint,
+        supported by both PostgreSQL and SQLite.
+        Django 4.0 bulk_create can't update conflicting rows
+        """
+        meta = OrderedProduct._meta
+        table = connection.ops.quote_name(meta.db_table)
+        order, product, quantity, date_added = (
+            connection.ops.quote_name(meta.get_field(field_name).column)
+            for field_name in ('order', 'product', 'quantity', 'date_added')
         )
-        return ordered_product
-
-    def __update_product_quantity_in_cart(
-            self,
-            ordered_product: OrderedProduct,
-            action: str
-    ) -> None:
-        """This function is changing quantity of product needed to update"""
-        match action:
-            case CartUpdateAction.ADD_TO_CART.value:
-                units_in_stock = ordered_product.product.units_in_stock
-                if ordered_product.quantity < units_in_stock:
-                    ordered_product.quantity += 1
-            case CartUpdateAction.REMOVE_FROM_CART.value:
-                ordered_product.quantity -= 1
-            case CartUpdateAction.DELETE_FROM_CART.value:
-                ordered_product.quantity = 0
-            case _:
-                raise self.CartUpdateError(f'Undefined {action = }')
+        now = meta.get_field('date_added').get_db_prep_value(timezone.now(), connection)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({order}, {product}, {quantity}, {date_added}) '
+                f'VALUES {", ".join(["(%s, %s, %s, %s)"] * len(rows))} '
+                f'ON CONFLICT ({order}, {product}) '
+                f'DO UPDATE SET {quantity} = {table}.{quantity} + excluded.{quantity}',
+                [value for row in rows for value in (*row, now)],
+            )
+
+
+class OrderedProductCorrection(NamedTuple):
+    product: Cable
+    ordered_quantity: int
+    available_quantity: int
 
 
 class DeliveryTypeConverter(TypedDict):
@@ -114,37 +396,46 @@ class UserInformationService:
         'selfPickUp': Order.DeliveryType.PICK_UP
     }
 
-    def __init__(self, customer: User, post_request_data: Optional[QueryDict]) -> None:
-        self.customer = customer
-        self.order, _ = Order.objects.get_or_create(
-            customer=self.customer,
-            status=Order.OrderStatus.IN_CART
-        )
-        self.ordered_products = OrderedProduct.objects.filter(
-            order=self.order
-        ).select_related('product').only(
-            'quantity',
-            'product__name',
-            'product__price'
-        )
+    def __init__(self, request: HttpRequest) -> None:
+        self.request = request
+        self.customer = request.user
+        self.order = request.cart
+        if self.order:
+            self.ordered_products = OrderedProduct.objects.filter(
+                order=self.order
+            ).with_product_title_photo()
+        else:
+            self.ordered_products = OrderedProduct.objects.none()
 
         self.form = UserInformationForm(
-            post_request_data or None,
+            request.POST or None,
             initial=UserInformationForm.get_user_information_form_initials(
                 self.customer
             )
         )
         self.delivery_type = self.delivery_type_converter.get(
-            post_request_data.get('radioDeliveryType')
+            request.POST.get('radioDeliveryType')
         )
 
     def process_checkout(self) -> None:
+        # Any error rolls back stock changes made for this order
+        with transaction.atomic():
+            # Cart lines are changed only under cart lock, see CartUpdateService.
+            # Cart accepted meanwhile by another request is not checked out twice
+            cart = Order.objects.select_for_update().filter(
+                pk=self.order.pk,
+                status=Order.OrderStatus.IN_CART,
+            ).first()
+            if cart is not None:
+                self.order = cart
+                self.__accept_order()
+        # Order is not in cart anymore
+        utils.set_lazy_cart(self.request)
+
+    def __accept_order(self) -> None:
+        """ Must be called inside transaction with locked cart """
         self.__update_customer_information()
-
-        if not self.__order_is_valid():
-            raise ProductsQuantityError(
-                'Ordered quantity is greater than available'
-            )
+        self.__update_products_in_stock()
 
         if self.delivery_type != Order.DeliveryType.PICK_UP:
             shipping_address = self.__get_shipping_address_from_form()
@@ -154,11 +445,11 @@ class UserInformationService:
                 raise ShippingAddressNotProvidedError
             self.order.shipping_address = shipping_address
 
-        self.__update_products_in_stock()
-
         self.order.status = Order.OrderStatus.ACCEPTED
         self.order.delivery_type = self.delivery_type
-        self.order.save()
+        self.order.save(update_fields=['shipping_address', 'status', 'delivery_type'])
+        # Units in stock are displayed on catalogue pages
+        transaction.on_commit(utils.bump_catalogue_version)
 
     def process_information_update(self) -> None:
         self.__update_customer_information()
@@ -196,21 +487,87 @@ class UserInformationService:
             )
         return shipping_address
 
-    def __order_is_valid(self) -> bool:
-        for ordered_product in self.ordered_products:
-            if ordered_product.quantity > ordered_product.product.units_in_stock:
-                return False
-        return True
-
     def __update_products_in_stock(self) -> None:
-        for ordered_product in self.ordered_products:
-            ordered_product.product.units_in_stock = max(
-                0,
-                ordered_product.product.units_in_stock - ordered_product.quantity
+        """
+        Decrease units in stock for all ordered cables with one UPDATE.
+        Only cables having enough units are updated, so if some of them
+        were bought by another customer, updated rows count is less than
+        ordered products count. Must be called inside transaction
+        with locked cart, lines read before the lock may be outdated
+        """
+        ordered_quantities = {
+            ordered_product.product_id: ordered_product.quantity
+            for ordered_product in self.ordered_products.all()
+        }
+        if not ordered_quantities:
+            return
+
+        # Lock cables in the same order for all customers to avoid deadlocks
+        list(Cable.objects.select_for_update().filter(
+            pk__in=ordered_quantities
+        ).order_by('pk').values_list('pk'))
+
+        enough_in_stock = Q()
+        ordered_quantity_cases = []
+        for product_id, quantity in ordered_quantities.items():
+            enough_in_stock |= Q(pk=product_id, units_in_stock__gte=quantity)
+            ordered_quantity_cases.append(When(pk=product_id, then=Value(quantity)))
+
+        updated_count = Cable.objects.filter(enough_in_stock).update(
+            units_in_stock=F('units_in_stock') - Case(
+                *ordered_quantity_cases,
+                output_field=IntegerField(),
+            ),
+            updated_at=Now(),
+        )
+        if updated_count != len(ordered_quantities):
+            raise ProductsQuantityError(
+                'Ordered quantity is greater than available'
             )
-            ordered_product.product.save()
 
-    def correct_ordered_products(self) -> None:
-        for ordered_product in self.ordered_products:
-            ordered_product.quantity = ordered_product.product.units_in_stock
-            ordered_product.save()
+    def correct_ordered_products(self) -> list[OrderedProductCorrection]:
+        """
+        Reduce ordered quantities greater than available in stock.
+        Products out of stock are removed from cart.
+        Returns corrections made to the cart
+        """
+        corrections = []
+        products_to_update = []
+        products_to_delete = []
+        quantity_delta = 0
+
+        with transaction.atomic():
+            # Cart lines are changed only under cart lock, see CartUpdateService
+            list(Order.objects.select_for_update().filter(pk=self.order.pk).values_list('pk'))
+            ordered_products = {
+                ordered_product.product_id: ordered_product
+                for ordered_product in self.ordered_products.all()
+            }
+            units_in_stock = dict(
+                Cable.objects.select_for_update().filter(
+                    pk__in=ordered_products
+                ).order_by('pk').values_list('pk', 'units_in_stock')
+            )
+            for product_id, ordered_product in ordered_products.items():
+                available_quantity = units_in_stock.get(product_id, 0)
+                if ordered_product.quantity <= available_quantity:
+                    continue
+
+                corrections.append(OrderedProductCorrection(
+                    product=ordered_product.product,
+                    ordered_quantity=ordered_product.quantity,
+                    available_quantity=available_quantity,
+                ))
+                quantity_delta += available_quantity - ordered_product.quantity
+                ordered_product.quantity = available_quantity
+                if available_quantity:
+                    products_to_update.append(ordered_product)
+                else:
+                    products_to_delete.append(ordered_product.pk)
+
+            OrderedProduct.objects.bulk_update(products_to_update, ['quantity'])
+            OrderedProduct.objects.filter(pk__in=products_to_delete).delete()
+            utils.update_cart_summary(self.order.pk, quantity_delta)
+
+        utils.set_lazy_cart(self.request)
+        return corrections
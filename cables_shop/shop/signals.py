@@ -0,0 +1,38 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import photo_jobs, search, utils
+from .models import Cable, CablePhoto, CableType
+
+
+@receiver(post_save, sender=Cable)
+@receiver(post_save, sender=CableType)
+@receiver(post_save, sender=CablePhoto)
+@receiver(post_delete, sender=Cable)
+@receiver(post_delete, sender=CableType)
+@receiver(post_delete, sender=CablePhoto)
+def catalogue_changed(**kwargs) -> None:
+    # Requests running before commit would cache old rows under the new version
+    transaction.on_commit(utils.bump_catalogue_version)
+
+
+@receiver(post_save, sender=Cable)
+def cable_saved(instance: Cable, **kwargs) -> None:
+    search.update_cables_index(Cable.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=CableType)
+def cable_type_saved(instance: CableType, **kwargs) -> None:
+    search.update_cables_index(Cable.objects.filter(type=instance))
+
+
+@receiver(post_delete, sender=Cable)
+def cable_deleted(instance: Cable, **kwargs) -> None:
+    search.remove_cable_from_index(instance.pk)
+
+
+@receiver(post_save, sender=CableType)
+@receiver(post_save, sender=CablePhoto)
+def photo_saved(instance, **kwargs) -> None:
+    photo_jobs.enqueue_photo_variants(instance)
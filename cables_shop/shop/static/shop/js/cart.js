@@ -1,26 +1,38 @@
 var updateBtns = document.getElementsByClassName('btn-update-cart')
-// var cartItemsTotalIndicator = document.getElementById('CartItemsTotalIndicator')
 
-const NOT_AUTHENTICATED_ACTION = 'not_authenticated'
+// Clicks made in a row are sent in one request
+const CART_UPDATE_DELAY_MS = 300
+
+var pendingOperations = []
+var cartUpdateTimer = null
 
 
 for (var i = 0; i < updateBtns.length; i++) {
     updateBtns[i].addEventListener('click', function () {
-        var productId = parseInt(this.dataset.product_id)
-        var action = this.dataset.action
-
-        var user = document.getElementById('user').value
-        if (user == 'AnonymousUser') {
-            sendJSONResponse(0, NOT_AUTHENTICATED_ACTION)
-        } else {
-            sendJSONResponse(productId, action)
-        }
-        updateTotalItemsIndicator(action)
+        // Anonymous users cart is kept in session
+        queueCartOperation(parseInt(this.dataset.product_id), this.dataset.action)
     })
 }
 
 
-function sendJSONResponse(productId, action) {
+function queueCartOperation(productId, action) {
+    var lastOperation = pendingOperations[pendingOperations.length - 1]
+    if (lastOperation && lastOperation.productId == productId && lastOperation.action == action) {
+        lastOperation.count += 1
+    } else {
+        pendingOperations.push({'productId': productId, 'action': action, 'count': 1})
+    }
+
+    clearTimeout(cartUpdateTimer)
+    cartUpdateTimer = setTimeout(function () {
+        var operations = pendingOperations
+        pendingOperations = []
+        sendJSONResponse(operations)
+    }, CART_UPDATE_DELAY_MS)
+}
+
+
+function sendJSONResponse(operations) {
     var url = '/updateCart/'
 
     fetch(url, {
@@ -30,8 +42,7 @@ function sendJSONResponse(productId, action) {
             'X-CSRFToken': csrftoken
         },
         body: JSON.stringify({
-            'productId': productId,
-            'action': action,
+            'operations': operations,
         })
     })
 
@@ -40,6 +51,42 @@ function sendJSONResponse(productId, action) {
         })
 
         .then((data) => {
-            location.reload()
+            // Errors are sent as strings
+            if (typeof data === 'object') {
+                updateCartState(data)
+            } else {
+                location.reload()
+            }
         })
-}
\ No newline at end of file
+}
+
+
+function updateCartState(cartState) {
+    var linesByProduct = {}
+    for (const line of cartState.lines) {
+        linesByProduct[line.productId] = line
+    }
+
+    var cartLines = document.getElementsByClassName('cart-line')
+    // Collection is live, so rows are removed starting from the end
+    for (var i = cartLines.length - 1; i >= 0; i--) {
+        var line = linesByProduct[cartLines[i].dataset.product_id]
+        if (line) {
+            cartLines[i].querySelector('.cart-line-quantity').textContent = line.quantity
+            cartLines[i].querySelector('.cart-line-total').textContent = line.totalPrice + ' ₽'
+        } else {
+            cartLines[i].remove()
+        }
+    }
+
+    var productsTotal = document.getElementById('cartProductsTotal')
+    if (productsTotal) {
+        productsTotal.textContent = cartState.productsTotal
+    }
+
+    var cartIndicator = document.getElementById('cartIndicator')
+    if (cartIndicator) {
+        document.getElementById('CartItemsTotalIndicator').textContent = cartState.itemsTotal
+        cartIndicator.classList.toggle('d-none', cartState.itemsTotal == 0)
+    }
+}
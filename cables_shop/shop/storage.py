@@ -0,0 +1,66 @@
+"""
+Storage naming uploaded files by hash of their content.
+File with such name never changes, so media is served
+with far-future immutable caching, see shop.views.serve_media
+and front server config in README
+"""
+import os
+import re
+from typing import Optional
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+from shop import config
+
+from .images import get_content_hash
+
+
+HASH_RE = rf'\.[0-9a-f]{{{config.PHOTO_HASH_LENGTH}}}'
+# Hashed uploads and photo variants, which names are content based too
+HASHED_NAME_RE = re.compile(rf'{HASH_RE}(\.\d+w)?\.\w+$')
+VARIANT_NAME_RE = re.compile(rf'{HASH_RE}\.\d+w\.\w+$')
+
+
+def is_hashed_name(name: str) -> bool:
+    return bool(HASHED_NAME_RE.search(name))
+
+
+def get_hashed_name(name: str, content: File, max_length: Optional[int] = None) -> str:
+    """
+    Name with content hash before extension. File name is shortened
+    to fit max_length, otherwise storage would replace hash with random suffix
+    """
+    content.seek(0)
+    content_hash = get_content_hash(b''.join(content.chunks()))
+    content.seek(0)
+    stem, extension = os.path.splitext(name)
+    # Renaming file already named by its hash keeps the name
+    if stem.endswith(f'.{content_hash}'):
+        return name
+
+    suffix = f'.{content_hash}{extension}'
+    if max_length is not None and len(stem) + len(suffix) > max_length:
+        directory, file_stem = os.path.split(stem)
+        file_stem = file_stem[:max_length - len(stem) - len(suffix)]
+        if not file_stem:
+            raise SuspiciousFileOperation(
+                f'File name "{name}" with content hash can\'t fit {max_length} characters'
+            )
+        stem = os.path.join(directory, file_stem)
+    return f'{stem}{suffix}'
+
+
+class ContentHashStorage(FileSystemStorage):
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not isinstance(content, File):
+            content = File(content, name)
+        # Photo variants are already named by content
+        if not VARIANT_NAME_RE.search(name):
+            name = get_hashed_name(name, content, max_length)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
@@ -1,7 +1,12 @@
+from typing import Union
+
 from django import template
 from django.db.models.query import QuerySet
+from django.http import HttpRequest
 
-from shop.models import CableType, Order, OrderedProduct
+from shop import utils
+from shop.images import ResponsivePhoto
+from shop.models import CableType, OrderedProduct
 
 
 register = template.Library()
@@ -18,19 +23,32 @@ def product_total_price(quantity: int, price: int) -> int:
 
 
 @register.simple_tag
-def cart_items_total(user) -> int:
-    """ Calculate ordered items total count"""
-    if not user.is_authenticated:
-        return 0
-    ordered_products = OrderedProduct.objects.select_related('order').filter(
-        order__customer=user,
-        order__status=Order.OrderStatus.IN_CART
-    ).values('quantity')
-    items_total = sum(item['quantity'] for item in ordered_products)
-    return items_total
+def cart_items_total(request: HttpRequest) -> int:
+    """ Ordered items total count from cart resolved by CartMiddleware or session cart"""
+    return utils.get_cart_items_total(request)
 
 
 @register.simple_tag
-def cart_price_total(products: QuerySet[OrderedProduct]) -> int:
+def cart_price_total(products: Union[QuerySet[OrderedProduct], list[OrderedProduct]]) -> int:
     """ Calculate total price for an order without delivery"""
-    return sum([product.quantity*product.product.price for product in products])
+    if isinstance(products, QuerySet):
+        return products.total_price()
+    # Session cart products are not saved
+    return sum(product.total_price for product in products)
+
+
+@register.inclusion_tag('shop/picture.html')
+def picture(photo: ResponsivePhoto, sizes: str, alt: str, css_class: str = '', width: int = None):
+    """ <picture> with modern formats sources and srcset of photo variants """
+    return {
+        'photo': photo,
+        'sizes': sizes,
+        'alt': alt,
+        'css_class': css_class,
+        'width': width,
+    }
+
+
+@register.filter
+def thumbnail_url(photo: ResponsivePhoto, width: int) -> str:
+    return photo.thumbnail_url(int(width))
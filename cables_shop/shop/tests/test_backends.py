@@ -0,0 +1,63 @@
+from unittest import mock
+
+from django.db.backends.postgresql import base
+from django.test import SimpleTestCase
+
+from shop.backends.postgresql.base import DatabaseWrapper
+
+
+class HealthCheckTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.wrapper = DatabaseWrapper({
+            'NAME': 'test',
+            'CONN_MAX_AGE': 60,
+            'CONN_HEALTH_CHECKS': True,
+            'AUTOCOMMIT': True,
+            'TIME_ZONE': None,
+        })
+        # Reused connection left from previous request
+        self.wrapper.connection = mock.Mock()
+        self.wrapper.autocommit = True
+        is_usable_patcher = mock.patch.object(self.wrapper, 'is_usable', return_value=True)
+        self.is_usable = is_usable_patcher.start()
+        self.addCleanup(is_usable_patcher.stop)
+
+    def test_checked_once_on_first_use(self):
+        self.wrapper.ensure_connection()
+        self.wrapper.ensure_connection()
+        self.is_usable.assert_called_once()
+
+    def test_checked_again_in_next_request(self):
+        self.wrapper.ensure_connection()
+        self.wrapper.close_if_unusable_or_obsolete()
+        self.is_usable.assert_called_once()
+        self.wrapper.ensure_connection()
+        self.assertEqual(self.is_usable.call_count, 2)
+
+    def test_not_checked_at_request_start(self):
+        self.wrapper.close_if_unusable_or_obsolete()
+        self.is_usable.assert_not_called()
+        self.assertIsNotNone(self.wrapper.connection)
+
+    def test_broken_connection_replaced(self):
+        self.is_usable.return_value = False
+        with mock.patch.object(self.wrapper, 'close') as close, \
+                mock.patch.object(base.DatabaseWrapper, 'ensure_connection') as ensure_connection:
+            self.wrapper.ensure_connection()
+        close.assert_called_once()
+        ensure_connection.assert_called_once()
+
+    def test_new_connection_not_checked(self):
+        self.wrapper.connection = None
+        with mock.patch.object(self.wrapper, 'get_connection_params'), \
+                mock.patch.object(self.wrapper, 'get_new_connection'), \
+                mock.patch.object(self.wrapper, 'init_connection_state'):
+            self.wrapper.ensure_connection()
+        self.wrapper.ensure_connection()
+        self.is_usable.assert_not_called()
+
+    def test_not_checked_without_health_checks(self):
+        self.wrapper.settings_dict['CONN_HEALTH_CHECKS'] = False
+        self.wrapper.ensure_connection()
+        self.is_usable.assert_not_called()
@@ -0,0 +1,293 @@
+import io
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from shop import config, images, photo_jobs
+from shop.models import (Cable, CablePhoto, CableType, PhotoVariantsJob,
+                         User)
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_image_file(name: str, size: tuple[int, int], mode: str = 'RGB') -> SimpleUploadedFile:
+    buffer = io.BytesIO()
+    Image.new(mode, size, 'red').save(buffer, format='PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+def run_image_worker(processes: int = 0) -> str:
+    stdout = io.StringIO()
+    call_command('run_image_worker', '--once', processes=processes, stdout=stdout, stderr=stdout)
+    return stdout.getvalue()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class PhotoVariantsTestCase(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        widths_patcher = mock.patch.object(config, 'PHOTO_VARIANT_WIDTHS', (70, 320, 640))
+        widths_patcher.start()
+        self.addCleanup(widths_patcher.stop)
+
+        self.cable_type = CableType.objects.create(
+            name='test type',
+            name_plural='test type cables',
+        )
+        self.cable = Cable.objects.create(
+            name='test cable',
+            slug='test-cable',
+            units_in_stock=5,
+            type=self.cable_type,
+        )
+        self.photo = CablePhoto.objects.create(
+            cable=self.cable,
+            photo=make_image_file('photo.png', (500, 250)),
+            is_title=True,
+        )
+        run_image_worker()
+        self.photo.refresh_from_db()
+
+    def test_variants_generated_on_save(self):
+        variants = CablePhoto.objects.get(pk=self.photo.pk).photo_variants
+        self.assertEqual(variants['source'], self.photo.photo.name)
+        self.assertEqual(variants['fallback'], 'jpeg')
+        self.assertEqual(set(variants['images']), {*images.MODERN_FORMATS, 'jpeg'})
+        for image_format, format_images in variants['images'].items():
+            # Photo is not upscaled to 640
+            self.assertEqual(set(format_images), {'70', '320'})
+            for width, name in format_images.items():
+                self.assertIn(variants['hash'], name)
+                with Image.open(os.path.join(MEDIA_ROOT, name)) as image:
+                    self.assertEqual(image.size, (int(width), int(width) // 2))
+                    self.assertEqual(image.format.lower(), image_format)
+
+    def test_transparent_photo_fallback_is_png(self):
+        self.photo.photo = make_image_file('transparent.png', (100, 100), 'RGBA')
+        self.photo.save()
+        run_image_worker()
+        self.photo.refresh_from_db()
+        self.assertEqual(self.photo.photo_variants['fallback'], 'png')
+
+    def test_variants_not_regenerated_for_same_photo(self):
+        self.photo.is_title = False
+        self.photo.save()
+        self.assertFalse(
+            PhotoVariantsJob.objects.filter(status=PhotoVariantsJob.JobStatus.PENDING).exists()
+        )
+
+    def test_photo_without_variants(self):
+        photo = CablePhoto.objects.create(cable=self.cable, photo='missing.jpg', is_title=False)
+        self.assertEqual(photo.responsive_photo.thumbnail_url(70), photo.photo_url)
+        self.assertEqual(photo.responsive_photo.srcset, '')
+
+    def test_thumbnail_url(self):
+        photo = self.photo.responsive_photo
+        variants = self.photo.photo_variants['images']['jpeg']
+        self.assertTrue(photo.thumbnail_url(50).endswith(variants['70']))
+        self.assertTrue(photo.thumbnail_url(100).endswith(variants['320']))
+        self.assertTrue(photo.thumbnail_url(1000).endswith(variants['320']))
+        self.assertIn(f'{variants["70"]} 70w', photo.srcset)
+
+    def test_annotated_title_photo(self):
+        cable = Cable.objects.with_title_photo().get(pk=self.cable.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(cable.title_photo.srcset, self.photo.responsive_photo.srcset)
+
+    def test_cable_card_picture(self):
+        response = self.client.get(reverse('all_cables_page'))
+        jpeg_variant = self.photo.photo_variants['images']['jpeg']['320']
+        self.assertContains(response, f'{jpeg_variant} 320w')
+        for image_format in images.MODERN_FORMATS:
+            self.assertContains(response, f'type="image/{image_format}"')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ImageWorkerTestCase(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.cable_type = CableType.objects.create(
+            name='test type',
+            name_plural='test type cables',
+            photo=make_image_file('type.png', (200, 100)),
+        )
+        self.cable = Cable.objects.create(
+            name='test cable',
+            slug='test-cable',
+            units_in_stock=5,
+            type=self.cable_type,
+        )
+        self.photo = CablePhoto.objects.create(
+            cable=self.cable,
+            photo=make_image_file('photo.png', (200, 100)),
+            is_title=True,
+        )
+
+    def test_jobs_queued_on_save(self):
+        self.assertEqual(self.photo.photovariantsjob_set.get().status, PhotoVariantsJob.JobStatus.PENDING)
+        self.assertEqual(self.cable_type.photovariantsjob_set.count(), 1)
+
+        # Pending job is not queued twice
+        self.photo.photo = make_image_file('photo_2.png', (200, 100))
+        self.photo.save()
+        self.assertEqual(self.photo.photovariantsjob_set.count(), 1)
+
+    def test_jobs_processed_in_pool(self):
+        output = run_image_worker(processes=2)
+
+        self.assertIn('Jobs done: 2, failed attempts: 0', output)
+        self.assertFalse(PhotoVariantsJob.objects.exclude(status=PhotoVariantsJob.JobStatus.DONE).exists())
+        self.photo.refresh_from_db()
+        self.cable_type.refresh_from_db()
+        self.assertEqual(self.photo.photo_variants['source'], self.photo.photo.name)
+        self.assertEqual(self.cable_type.photo_variants['source'], self.cable_type.photo.name)
+
+    def test_failed_job_retried(self):
+        self.photo.photo = SimpleUploadedFile('broken.png', b'not an image')
+        self.photo.save()
+
+        output = run_image_worker()
+        self.assertIn('failed attempts: 1', output)
+        job = self.photo.photovariantsjob_set.get()
+        self.assertEqual(job.status, PhotoVariantsJob.JobStatus.PENDING)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('UnidentifiedImageError', job.error)
+        self.assertGreater(job.run_after, timezone.now())
+
+        # Job is postponed, so it isn't tried again right away
+        self.assertIn('failed attempts: 0', run_image_worker())
+
+        job.run_after = timezone.now()
+        job.attempts = config.PHOTO_JOB_MAX_ATTEMPTS - 1
+        job.save()
+        run_image_worker()
+        job.refresh_from_db()
+        self.assertEqual(job.status, PhotoVariantsJob.JobStatus.FAILED)
+        self.assertEqual(job.attempts, config.PHOTO_JOB_MAX_ATTEMPTS)
+
+    def test_stale_jobs_requeued(self):
+        photo_jobs.claim_jobs(limit=10)
+        self.assertEqual(photo_jobs.requeue_stale_jobs(), 0)
+
+        PhotoVariantsJob.objects.update(
+            updated_at=timezone.now() - timedelta(seconds=config.PHOTO_JOB_TIMEOUT + 1)
+        )
+        self.assertEqual(photo_jobs.requeue_stale_jobs(), 2)
+
+    def test_replaced_photo_variants_not_saved(self):
+        job = self.photo.photovariantsjob_set.get()
+        old_name = self.photo.photo.name
+        variants = photo_jobs.make_variants('shop.CablePhoto', old_name)
+        self.photo.photo = make_image_file('photo_2.png', (200, 100))
+        self.photo.save()
+
+        photo_jobs.complete_job(job, old_name, variants)
+        self.photo.refresh_from_db()
+        self.assertEqual(self.photo.photo_variants, {})
+
+    def test_completed_job_changes_photo_modification_time(self):
+        job = self.photo.photovariantsjob_set.get()
+        variants = photo_jobs.make_variants('shop.CablePhoto', self.photo.photo.name)
+        updated_at = self.photo.updated_at
+
+        photo_jobs.complete_job(job, self.photo.photo.name, variants)
+        self.photo.refresh_from_db()
+        self.assertEqual(self.photo.photo_variants, variants)
+        self.assertGreater(self.photo.updated_at, updated_at)
+
+    def test_admin_job_status(self):
+        admin = User.objects.create_superuser(
+            'admin@test.ru', 'admin_password', 'Admin', 'Admin', '+79261234567'
+        )
+        self.client.force_login(admin)
+        response = self.client.get(reverse('admin:shop_cablephoto_changelist'))
+        self.assertContains(response, 'В очереди, попыток: 0')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RebuildPhotoVariantsTestCase(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        widths_patcher = mock.patch.object(config, 'PHOTO_VARIANT_WIDTHS', (70, 160))
+        widths_patcher.start()
+        self.addCleanup(widths_patcher.stop)
+
+        self.cable_type = CableType.objects.create(
+            name='test type',
+            name_plural='test type cables',
+            photo=make_image_file('rebuild_type.png', (200, 100)),
+        )
+        cable = Cable.objects.create(
+            name='test cable',
+            slug='test-cable',
+            units_in_stock=5,
+            type=self.cable_type,
+        )
+        self.photo = CablePhoto.objects.create(
+            cable=cable,
+            photo=make_image_file('rebuild_photo.png', (200, 100)),
+            is_title=True,
+        )
+        self.variants_count = 2 * (len(images.MODERN_FORMATS) + 1)
+
+    def rebuild(self, *args) -> str:
+        stdout = io.StringIO()
+        call_command('rebuild_photo_variants', *args, processes=1, stdout=stdout, stderr=stdout)
+        return stdout.getvalue()
+
+    def test_dry_run(self):
+        output = self.rebuild('--dry-run')
+        self.assertIn(f'Variants to build: {self.variants_count * 2}, up to date: 0', output)
+        self.photo.refresh_from_db()
+        self.assertEqual(self.photo.photo_variants, {})
+
+    def test_rebuild(self):
+        output = self.rebuild()
+        self.assertIn(f'Variants built: {self.variants_count * 2}, up to date: 0, photos updated: 2', output)
+        self.assertIn('Photos: 2', output)
+        self.photo.refresh_from_db()
+        self.assertEqual(self.photo.photo_variants['source'], self.photo.photo.name)
+
+        output = self.rebuild()
+        self.assertIn(f'Variants built: 0, up to date: {self.variants_count * 2}, photos updated: 0', output)
+
+        # Only variants of new width are built
+        with mock.patch.object(config, 'PHOTO_VARIANT_WIDTHS', (70, 120, 160)):
+            output = self.rebuild()
+        self.assertIn(f'Variants built: {self.variants_count}, up to date: {self.variants_count * 2}', output)
+
+    def test_verify(self):
+        with self.assertRaises(CommandError):
+            self.rebuild('--verify')
+
+        self.rebuild()
+        self.assertIn('Photos with broken variants: 0', self.rebuild('--verify'))
+
+        self.photo.refresh_from_db()
+        missing_variant = self.photo.photo_variants['images']['jpeg']['70']
+        os.remove(os.path.join(MEDIA_ROOT, missing_variant))
+        stdout = io.StringIO()
+        with self.assertRaisesMessage(CommandError, 'Failed photos: 1'):
+            call_command('rebuild_photo_variants', '--verify', processes=1, stdout=stdout, stderr=stdout)
+        self.assertIn(f'{missing_variant}: missing', stdout.getvalue())
@@ -0,0 +1,43 @@
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+
+from shop.middleware import CartMiddleware
+from shop.models import Order, User
+
+
+class CartMiddlewareTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            'test@mail.ru',
+            'test_password',
+            'Sergey',
+            'Frolov',
+            '+79219084376',
+        )
+        self.middleware = CartMiddleware(lambda request: HttpResponse())
+        self.request = RequestFactory().get('/')
+
+    def test_cart_resolved_once(self):
+        Order.objects.create(customer=self.user, status=Order.OrderStatus.IN_CART)
+        self.request.user = self.user
+        self.middleware(self.request)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.request.cart.customer_id, self.user.pk)
+            self.assertEqual(self.request.cart.status, Order.OrderStatus.IN_CART)
+            self.assertEqual(self.request.cart.items_total, 0)
+
+    def test_cart_not_created_if_not_exists(self):
+        self.request.user = self.user
+        self.middleware(self.request)
+
+        self.assertFalse(self.request.cart)
+        self.assertEqual(Order.objects.filter(customer=self.user).count(), 0)
+
+    def test_anonymous_user_has_no_cart(self):
+        self.request.user = AnonymousUser()
+        self.middleware(self.request)
+
+        with self.assertNumQueries(0):
+            self.assertFalse(self.request.cart)
@@ -1,6 +1,11 @@
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection
+from django.http import QueryDict
 from django.test import TestCase
+from django.urls import reverse
 
 from shop import config
+from shop.forms import CableFilterForm
 from shop.models import (Cable, CablePhoto, CableType, Order, OrderedProduct,
                          ShippingAddress, User)
 
@@ -86,10 +91,27 @@ class CablesTestCase(BaseTestCase):
         )
         self.assertEqual(self.cable_without_photo.title_photo_url, '')
 
+    def test_cable_title_photo_url_annotated(self):
+        cables = {
+            cable.pk: cable for cable in Cable.objects.with_title_photo()
+        }
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                cables[self.cable_with_photo.pk].title_photo_url,
+                '/media/test_title_photo.jpg'
+            )
+            self.assertEqual(cables[self.cable_without_photo.pk].title_photo_url, '')
+
     def test_cable_photo_str(self):
         self.assertEqual(str(self.title_cable_photo), 'title test ...')
         self.assertEqual(str(self.nontitle_cable_photo), 'test ...')
 
+    def test_cable_second_title_photo_invalid(self):
+        self.nontitle_cable_photo.is_title = True
+        with self.assertRaises(ValidationError):
+            self.nontitle_cable_photo.full_clean()
+        self.title_cable_photo.full_clean()
+
 
 class UserTestCase(BaseTestCase):
     """
@@ -217,23 +239,132 @@ class OrderTestCase(BaseTestCase):
         )
 
     def test_ordered_product_str(self):
-        self.assertEqual(str(self.product_1_in_cart), '#9, test cable, 100 см.')
+        self.assertEqual(
+            str(self.product_1_in_cart),
+            f'#{self.order_in_cart.pk}, test cable, 100 см.'
+        )
+
+    def test_one_line_per_product_in_order(self):
+        with self.assertRaises(IntegrityError):
+            OrderedProduct.objects.create(
+                order=self.order_in_cart,
+                product=self.cable_with_photo,
+                quantity=1,
+            )
+
+    def test_ordered_products_with_title_photo(self):
+        ordered_products = list(
+            self.order_in_cart.orderedproduct_set.with_product_title_photo()
+        )
+        with self.assertNumQueries(0):
+            photo_urls = {
+                product.product.title_photo_url for product in ordered_products
+            }
+        self.assertEqual(photo_urls, {'/media/test_title_photo.jpg', ''})
 
     def test_get_product_total_price(self):
         self.assertEqual(self.product_1_in_cart.total_price, 300)
 
     def test_order_str(self):
-        self.assertEqual(str(self.order_in_cart), '№5: test@test.ru, В корзине')
+        self.assertEqual(
+            str(self.order_in_cart),
+            f'№{self.order_in_cart.pk}: test@test.ru, В корзине'
+        )
 
     def test_order_absolute_url(self):
-        self.assertEqual(self.order_in_cart.get_absolute_url(), '/order/3')
+        self.assertEqual(
+            self.order_in_cart.get_absolute_url(),
+            f'/order/{self.order_in_cart.pk}'
+        )
 
     def test_products_total_price(self):
         self.assertEqual(self.order_in_cart.products_total_price, 900)
 
+    def test_products_total_price_annotated(self):
+        orders = {order.pk: order for order in Order.objects.with_totals()}
+        with self.assertNumQueries(0):
+            self.assertEqual(orders[self.order_in_cart.pk].products_total_price, 900)
+            self.assertEqual(
+                orders[self.accepted_order_pick_up.pk].order_total_price,
+                500
+            )
+
+    def test_admin_products_total_price_follows_cable_price(self):
+        admin = User.objects.create_superuser(
+            'admin@test.ru', 'admin_password', 'Admin', 'Admin', '+79261234599'
+        )
+        self.client.force_login(admin)
+        self.cable_with_photo.price = 200
+        self.cable_with_photo.save()
+
+        response = self.client.get(reverse('admin:shop_order_changelist'))
+        self.assertContains(
+            response,
+            '<td class="field-products_total_price">1000</td>',
+            html=True,
+        )
+
+    def test_empty_order_products_total_price(self):
+        order = Order.objects.create(customer=self.user, status=Order.OrderStatus.ACCEPTED)
+        self.assertEqual(order.products_total_price, 0)
+        self.assertEqual(
+            Order.objects.with_totals().get(pk=order.pk).products_total_price,
+            0
+        )
+
     def test_order_total_price(self):
         self.assertEqual(
             self.order_in_cart.order_total_price,
             900 + config.DELIVERY_PRICE
         )
         self.assertEqual(self.accepted_order_pick_up.order_total_price, 500)
+
+
+class HotLookupsQueryPlanTestCase(BaseTestCase):
+    """ Lookups made on almost every request should use unique indexes """
+
+    def setUp(self):
+        super().setUp()
+        self.cart = Order.objects.create(customer=self.user)
+        if connection.vendor == 'postgresql':
+            # Test tables are tiny, so planner would prefer sequential scans
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+            self.addCleanup(self.reset_seqscan)
+
+    @staticmethod
+    def reset_seqscan():
+        with connection.cursor() as cursor:
+            cursor.execute('RESET enable_seqscan')
+
+    def assertUsesIndex(self, queryset, index_name: str):
+        plan = queryset.explain()
+        if connection.vendor == 'sqlite':
+            # SQLite creates unique constraints along with table
+            # and names their indexes by table
+            index_name = rf'{index_name}|sqlite_autoindex_{queryset.model._meta.db_table}_\d'
+        self.assertRegex(plan, index_name)
+
+    def test_cart_lookup(self):
+        self.assertUsesIndex(
+            Order.objects.filter(customer=self.user, status=Order.OrderStatus.IN_CART),
+            'order_one_cart_per_customer',
+        )
+
+    def test_cart_line_lookup(self):
+        self.assertUsesIndex(
+            OrderedProduct.objects.filter(order=self.cart, product=self.cable_with_photo),
+            'ordered_product_unique_line',
+        )
+
+    def test_cables_page_ordering(self):
+        cables = CableFilterForm(QueryDict()).filter_cables(Cable.objects.for_sale())[:24]
+        # Ordering by type would join types to order by their default ordering
+        self.assertNotIn('shop_cabletype', str(cables.query))
+        self.assertUsesIndex(cables, 'cable_for_sale_ordering_idx')
+
+    def test_title_photo_lookup(self):
+        self.assertUsesIndex(
+            CablePhoto.objects.filter(cable=self.cable_with_photo, is_title=True).order_by(),
+            'cable_photo_one_title',
+        )
@@ -0,0 +1,37 @@
+import importlib
+import os
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+
+from cables_shop.settings import dev, prod
+
+
+class SettingsProfilesTestCase(SimpleTestCase):
+
+    def test_prod_profile_without_debug_toolbar(self):
+        self.assertFalse(prod.DEBUG)
+        self.assertNotIn('debug_toolbar', prod.INSTALLED_APPS)
+        self.assertFalse(any('debug_toolbar' in middleware for middleware in prod.MIDDLEWARE))
+
+    def test_prod_profile_requires_shared_cache(self):
+        local_cache = 'django.core.cache.backends.locmem.LocMemCache'
+        self.assertNotEqual(prod.CACHES['default']['BACKEND'], local_cache)
+        with mock.patch.dict(os.environ, {'CACHE_BACKEND': local_cache}):
+            with self.assertRaises(ImproperlyConfigured):
+                importlib.reload(prod)
+        importlib.reload(prod)
+
+    def test_profiles_cache_templates(self):
+        for profile in (dev, prod):
+            loaders = profile.TEMPLATES[0]['OPTIONS']['loaders']
+            self.assertEqual(loaders[0][0], 'django.template.loaders.cached.Loader')
+
+    def test_prod_profile_without_debug_context_processor(self):
+        options = prod.TEMPLATES[0]['OPTIONS']
+        self.assertNotIn('django.template.context_processors.debug', options['context_processors'])
+
+    def test_dev_profile_with_debug_toolbar(self):
+        self.assertTrue(dev.DEBUG)
+        self.assertIn('debug_toolbar', dev.INSTALLED_APPS)
@@ -0,0 +1,152 @@
+import io
+import os
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+
+from shop import storage
+from shop.images import get_content_hash
+from shop.models import Cable, CablePhoto, CableType
+from shop.views import serve_media
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ContentHashStorageTestCase(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.storage = storage.ContentHashStorage()
+        self.content_hash = get_content_hash(b'content')
+
+    def test_file_named_by_content_hash(self):
+        name = self.storage.save('photos/photo.png', ContentFile(b'content'))
+        self.assertEqual(name, f'photos/photo.{self.content_hash}.png')
+        self.assertTrue(storage.is_hashed_name(name))
+
+        # Same content is stored once, other content gets other name
+        self.assertEqual(self.storage.save('photos/photo.png', ContentFile(b'content')), name)
+        self.assertNotEqual(self.storage.save('photos/photo.png', ContentFile(b'other')), name)
+        self.assertEqual(self.storage.save(name, ContentFile(b'content')), name)
+
+    def test_long_name_shortened_to_keep_hash(self):
+        max_length = CablePhoto._meta.get_field('photo').max_length
+        long_name = f'photos/{"long" * 30}.png'
+        name = self.storage.save(long_name, ContentFile(b'content'), max_length=max_length)
+        self.assertEqual(len(name), max_length)
+        self.assertTrue(name.startswith('photos/long'))
+        self.assertTrue(name.endswith(f'.{self.content_hash}.png'))
+        self.assertTrue(storage.is_hashed_name(name))
+        self.assertEqual(
+            self.storage.save(long_name, ContentFile(b'content'), max_length=max_length),
+            name
+        )
+
+    def test_variant_name_kept(self):
+        name = f'photos/photo.{self.content_hash}.70w.webp'
+        self.assertEqual(self.storage.save(name, ContentFile(b'variant')), name)
+        self.assertTrue(storage.is_hashed_name(name))
+        self.assertFalse(storage.is_hashed_name('photos/photo.png'))
+
+    def test_hashed_media_cached(self):
+        name = self.storage.save('photos/photo.png', ContentFile(b'content'))
+        response = serve_media(RequestFactory().get(f'/media/{name}'), name)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+
+        with open(os.path.join(MEDIA_ROOT, 'photos', 'legacy.png'), 'wb') as legacy_file:
+            legacy_file.write(b'content')
+        response = serve_media(RequestFactory().get('/media/photos/legacy.png'), 'photos/legacy.png')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Cache-Control'))
+
+    def test_media_not_served_in_production(self):
+        name = self.storage.save('photos/photo.png', ContentFile(b'content'))
+        self.assertEqual(self.client.get(f'/media/{name}').status_code, 404)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class HashMediaNamesTestCase(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        os.makedirs(os.path.join(MEDIA_ROOT, 'photos'), exist_ok=True)
+        with open(os.path.join(MEDIA_ROOT, 'photos', 'old.png'), 'wb') as old_file:
+            old_file.write(b'content')
+        self.new_name = f'photos/old.{get_content_hash(b"content")}.png'
+
+        self.cable_type = CableType.objects.create(
+            name='test type',
+            name_plural='test type cables',
+            photo='photos/old.png',
+        )
+        cable = Cable.objects.create(
+            name='test cable',
+            slug='test-cable',
+            units_in_stock=5,
+            type=self.cable_type,
+        )
+        self.photo = CablePhoto.objects.create(cable=cable, photo='photos/old.png', is_title=True)
+        CablePhoto.objects.filter(pk=self.photo.pk).update(
+            photo_variants={'source': 'photos/old.png', 'images': {}}
+        )
+        self.missing_photo = CablePhoto.objects.create(cable=cable, photo='photos/missing.png', is_title=False)
+
+    def hash_media_names(self, *args) -> str:
+        stdout = io.StringIO()
+        call_command('hash_media_names', *args, stdout=stdout, stderr=stdout)
+        return stdout.getvalue()
+
+    def test_dry_run(self):
+        output = self.hash_media_names('--dry-run')
+        self.assertIn(f'photos/old.png -> {self.new_name}', output)
+        self.assertIn('Files renamed: 1, rows updated: 0', output)
+        self.photo.refresh_from_db()
+        self.assertEqual(self.photo.photo.name, 'photos/old.png')
+        self.assertTrue(os.path.exists(os.path.join(MEDIA_ROOT, 'photos', 'old.png')))
+
+    def test_files_renamed(self):
+        updated_at = self.photo.updated_at
+        output = self.hash_media_names()
+        self.assertIn('photos/missing.png: file not found', output)
+        self.assertIn('Files renamed: 1, rows updated: 2', output)
+
+        self.photo.refresh_from_db()
+        self.cable_type.refresh_from_db()
+        self.assertEqual(self.photo.photo.name, self.new_name)
+        self.assertEqual(self.photo.photo_variants['source'], self.new_name)
+        self.assertGreater(self.photo.updated_at, updated_at)
+        self.assertEqual(self.cable_type.photo.name, self.new_name)
+        # Pages cached by browsers may still refer to old file
+        self.assertTrue(os.path.exists(os.path.join(MEDIA_ROOT, 'photos', 'old.png')))
+        self.assertTrue(os.path.exists(os.path.join(MEDIA_ROOT, self.new_name)))
+
+        self.assertIn('Files renamed: 0, rows updated: 0', self.hash_media_names())
+
+    def test_old_files_deleted(self):
+        with open(os.path.join(MEDIA_ROOT, 'photos', 'not_renamed.png'), 'wb') as other_file:
+            other_file.write(b'other content')
+        # Old file is used until photos are renamed
+        self.assertIn('Old files deleted: 0', self.hash_media_names('--delete-old'))
+        self.hash_media_names()
+
+        output = self.hash_media_names('--delete-old', '--dry-run')
+        self.assertIn(f'photos/old.png: old copy of {self.new_name}', output)
+        self.assertTrue(os.path.exists(os.path.join(MEDIA_ROOT, 'photos', 'old.png')))
+
+        self.assertIn('Old files deleted: 1', self.hash_media_names('--delete-old'))
+        self.assertFalse(os.path.exists(os.path.join(MEDIA_ROOT, 'photos', 'old.png')))
+        self.assertTrue(os.path.exists(os.path.join(MEDIA_ROOT, self.new_name)))
+        # File without hashed copy is not known to be replaced
+        self.assertTrue(os.path.exists(os.path.join(MEDIA_ROOT, 'photos', 'not_renamed.png')))
@@ -1,8 +1,9 @@
+from django.core.cache import cache
+from django.template import engines
 from django.test import TestCase
 
 from shop import utils
-from shop.models import (Cable, CableType, Order, OrderedProduct,
-                         ShippingAddress, User)
+from shop.models import Cable, CableType, Order, ShippingAddress, User
 
 
 class UtilsTestCase(TestCase):
@@ -77,30 +78,32 @@ class UtilsTestCase(TestCase):
             1
         )
 
-    def test_save_ordered_product(self):
-        order = Order.objects.create(
-            customer=self.user,
-            status=Order.OrderStatus.IN_CART
-        )
-        ordered_product = OrderedProduct.objects.create(
-            order=order,
-            product=self.cable,
-            quantity=2,
-        )
-        utils.save_or_delete_ordered_product(ordered_product)
-        self.assertEqual(OrderedProduct.objects.count(), 1)
-        self.assertEqual(ordered_product.quantity, 2)
+    def test_catalogue_version_bumped(self):
+        cache.clear()
+        version = utils.get_catalogue_version()
+        self.assertEqual(utils.get_catalogue_version(), version)
 
-    def test_delete_ordered_product(self):
-        order = Order.objects.create(
-            customer=self.user,
-            status=Order.OrderStatus.IN_CART
-        )
-        ordered_product = OrderedProduct.objects.create(
-            order=order,
-            product=self.cable,
-            quantity=-1,
-        )
-        self.assertEqual(OrderedProduct.objects.count(), 1)
-        utils.save_or_delete_ordered_product(ordered_product)
-        self.assertEqual(OrderedProduct.objects.count(), 0)
+        utils.bump_catalogue_version()
+        self.assertEqual(utils.get_catalogue_version(), version + 1)
+
+    def test_catalogue_version_bumped_on_catalogue_change(self):
+        version = utils.get_catalogue_version()
+        self.cable.price = 200
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cable.save()
+            # Not committed change mustn't be cached under the new version
+            self.assertEqual(utils.get_catalogue_version(), version)
+        self.assertGreater(utils.get_catalogue_version(), version)
+
+    def test_warm_up_without_queries(self):
+        with self.assertNumQueries(0):
+            utils.warm_up()
+
+    def test_templates_compiled_to_cache(self):
+        loader = engines['django'].engine.template_loaders[0]
+        loader.reset()
+        with self.assertNumQueries(0):
+            templates_count = utils.compile_templates()
+        self.assertGreater(templates_count, 0)
+        self.assertEqual(len(loader.get_template_cache), templates_count)
+        self.assertIn('shop/base.html', loader.get_template_cache)
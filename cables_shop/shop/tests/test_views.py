@@ -1,10 +1,25 @@
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
 from django.contrib import auth
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.http import QueryDict
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings, skipUnlessDBFeature)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.views.generic import TemplateView
 
-from shop import config
+from shop import config, search
 from shop.models import (Cable, CablePhoto, CableType, Order, OrderedProduct,
                          ShippingAddress, User)
+from shop.services import UserInformationService
+from shop.views import ConditionalGetMixin
 
 
 class BaseTestCase(TestCase):
@@ -27,6 +42,7 @@ class BaseTestCase(TestCase):
             customer=self.user,
             status=Order.OrderStatus.IN_CART,
             delivery_type=Order.DeliveryType.DELIVERY,
+            items_total=3,
         )
 
         self.cable_type = CableType.objects.create(
@@ -91,12 +107,12 @@ class SimpleViewsTestCase(BaseTestCase):
         template_name = 'shop/all_cables.html'
 
         response = self.client.get(self.all_cables_url)
-        photos = response.context['photos']
+        cables = response.context['cables']
         page_title = response.context['title']
 
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, template_name)
-        self.assertEqual(photos.count(), 1)
+        self.assertEqual(len(cables), 1)
         self.assertEqual(page_title, config.ALL_CABLES_PAGE_TITLE)
 
     def test_cable_page_GET(self):
@@ -120,6 +136,332 @@ class SimpleViewsTestCase(BaseTestCase):
         self.assertTemplateUsed(response, template_name)
 
 
+@mock.patch.object(config, 'CABLES_PAGE_SIZE', 2)
+class AllCablesFilteringTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.all_cables_url = reverse('all_cables_page')
+        self.cable_type_2 = CableType.objects.create(
+            name='test type 2',
+            name_plural='test type cables 2',
+        )
+        for i, (cable_type, price, units_in_stock) in enumerate((
+                (self.cable_type, 200, 0),
+                (self.cable_type, 200, 5),
+                (self.cable_type_2, 50, 5),
+        )):
+            cable = Cable.objects.create(
+                name=f'test cable {i}',
+                slug=f'test-cable-{i}',
+                length_sm=50,
+                price=price,
+                units_in_stock=units_in_stock,
+                type=cable_type,
+            )
+            CablePhoto.objects.create(cable=cable, photo='photo.jpg', is_title=True)
+
+        # Cables without title photo or not for sale are not displayed
+        Cable.objects.create(
+            name='no photo cable',
+            slug='no-photo-cable',
+            units_in_stock=5,
+            type=self.cable_type,
+        )
+        Cable.objects.create(
+            name='not for sale cable',
+            slug='not-for-sale-cable',
+            units_in_stock=5,
+            is_for_sale=False,
+            type=self.cable_type,
+        )
+
+    def get_cable_names(self, query_params: dict) -> list[str]:
+        response = self.client.get(self.all_cables_url, query_params)
+        return [cable.name for cable in response.context['cables']]
+
+    def test_filters(self):
+        self.assertListEqual(
+            self.get_cable_names({'type': self.cable_type_2.pk}),
+            ['test cable 2']
+        )
+        self.assertListEqual(
+            self.get_cable_names({'min_price': 150, 'max_price': 250}),
+            ['test cable 0', 'test cable 1']
+        )
+        self.assertListEqual(
+            self.get_cable_names({'length': 100}),
+            ['test cable']
+        )
+        self.assertListEqual(
+            self.get_cable_names({'in_stock': 'on', 'length': 50}),
+            ['test cable 1', 'test cable 2']
+        )
+
+    def test_invalid_filter_ignored(self):
+        self.assertListEqual(
+            self.get_cable_names({'min_price': 'abc', 'type': 'abc', 'max_price': 150}),
+            ['test cable', 'test cable 2']
+        )
+
+    def test_filter_query_canonical(self):
+        filter_queries = {
+            self.client.get(self.all_cables_url, query_params).context['filter_query']
+            for query_params in (
+                {'type': [self.cable_type.pk, self.cable_type_2.pk], 'in_stock': 'on'},
+                {'in_stock': 'on', 'type': [self.cable_type_2.pk, self.cable_type.pk], 'x': 1},
+            )
+        }
+        self.assertSetEqual(
+            filter_queries,
+            {f'type={self.cable_type.pk}&type={self.cable_type_2.pk}&in_stock=on'}
+        )
+
+    def test_keyset_pagination(self):
+        names = []
+        query_params = {'in_stock': 'on'}
+        while True:
+            response = self.client.get(self.all_cables_url, query_params)
+            names.extend(cable.name for cable in response.context['cables'])
+            next_page_query = response.context['cables'].next_page_query
+            if not next_page_query:
+                break
+            query_params = QueryDict(next_page_query)
+
+        self.assertListEqual(
+            names,
+            ['test cable', 'test cable 1', 'test cable 2']
+        )
+
+
+class SearchPageTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.search_url = reverse('search_page')
+        self.interconnect_type = CableType.objects.create(
+            name='Межблочный',
+            name_plural='Межблочные кабели',
+        )
+        self.interconnect = Cable.objects.create(
+            name='Кабель с позолоченными разъёмами',
+            slug='gold-cable',
+            units_in_stock=5,
+            description='Медные проводники в оплётке',
+            type=self.interconnect_type,
+        )
+        CablePhoto.objects.create(cable=self.interconnect, photo='photo.jpg', is_title=True)
+
+    def search(self, query: str) -> list[Cable]:
+        response = self.client.get(self.search_url, {'q': query})
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'shop/search.html')
+        return list(response.context['cables'])
+
+    def test_search_by_word_forms(self):
+        self.assertEqual(self.search('позолоченные разъёмы'), [self.interconnect])
+        self.assertEqual(self.search('медный проводник'), [self.interconnect])
+
+    def test_search_by_cable_type(self):
+        self.assertEqual(self.search('межблочные кабели'), [self.interconnect])
+
+    def test_search_requires_all_words(self):
+        self.assertEqual(self.search('позолоченный test'), [])
+        self.assertEqual(self.search(''), [])
+
+    def test_search_ranks_name_matches_first(self):
+        described_cable = Cable.objects.create(
+            name='test cable 2',
+            slug='test-cable-2',
+            units_in_stock=5,
+            description='Кабель в оплётке',
+            type=self.cable_type,
+        )
+        CablePhoto.objects.create(cable=described_cable, photo='photo.jpg', is_title=True)
+
+        self.assertEqual(self.search('кабель'), [self.interconnect, described_cable])
+
+    def test_search_limit_applied_to_cables_for_sale(self):
+        Cable.objects.bulk_create(
+            Cable(
+                name=f'Позолоченный кабель {i}',
+                slug=f'hidden-gold-cable-{i}',
+                units_in_stock=5,
+                is_for_sale=False,
+                type=self.interconnect_type,
+            )
+            for i in range(3)
+        )
+        search.update_cables_index(Cable.objects.all())
+
+        with mock.patch.object(config, 'SEARCH_RESULTS_LIMIT', 2):
+            self.assertEqual(self.search('позолоченный'), [self.interconnect])
+
+    def test_search_index_updates(self):
+        self.interconnect.name = 'Акустический кабель'
+        self.interconnect.save()
+        self.assertEqual(self.search('позолоченный'), [])
+        self.assertEqual(self.search('акустические'), [self.interconnect])
+
+        self.interconnect_type.name = 'Цифровой'
+        self.interconnect_type.save()
+        self.assertEqual(self.search('цифровые'), [self.interconnect])
+
+        self.interconnect.is_for_sale = False
+        self.interconnect.save()
+        self.assertEqual(self.search('цифровые'), [])
+
+        self.interconnect.delete()
+        self.assertEqual(self.search('цифровые'), [])
+
+
+class StaticAssetsTestCase(BaseTestCase):
+    def test_bundles_up_to_date(self):
+        call_command('build_assets', '--check')
+
+    def test_pages_load_bundles_only(self):
+        response = self.client.get(reverse('home_page'))
+        self.assertContains(response, 'shop/dist/shop.css', count=1)
+        self.assertContains(response, 'shop/dist/shop.js', count=1)
+        self.assertNotContains(response, '<script src="http')
+        self.assertNotContains(response, 'rel="stylesheet" href="http')
+
+
+class CatalogueCacheTestCase(BaseTestCase):
+    """ Catalogue pages content is cached until catalogue is changed """
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.all_cables_url = reverse('all_cables_page')
+
+    def test_cached_until_catalogue_changed(self):
+        self.client.get(self.all_cables_url)
+
+        # Queryset update doesn't send signals, so cache is not invalidated
+        Cable.objects.filter(pk=self.cable.pk).update(name='renamed cable')
+        response = self.client.get(self.all_cables_url)
+        self.assertContains(response, 'test cable')
+        self.assertNotContains(response, 'renamed cable')
+
+        self.cable.name = 'renamed cable'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cable.save()
+        response = self.client.get(self.all_cables_url)
+        self.assertContains(response, 'renamed cable')
+
+    def test_cached_page_not_queries_catalogue(self):
+        self.client.get(self.all_cables_url)
+        with self.assertNumQueries(0):
+            self.client.get(self.all_cables_url)
+
+    def test_cached_by_valid_filters_only(self):
+        self.client.get(self.all_cables_url, {'min_price': 0, 'unknown': 1})
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                self.all_cables_url,
+                {'unknown': 2, 'max_price': 'invalid', 'min_price': 0},
+            )
+        self.assertNotContains(response, 'unknown')
+        self.assertNotContains(response, 'value="invalid"')
+
+    def test_user_header_not_cached(self):
+        response = self.client.get(self.all_cables_url)
+        self.assertContains(response, 'Регистрация')
+
+        self.client.force_login(self.user)
+        response = self.client.get(self.all_cables_url)
+        self.assertNotContains(response, 'Регистрация')
+        self.assertContains(response, 'Личный')
+
+    def test_cart_not_created_by_page_view(self):
+        customer = User.objects.create_user(
+            'customer@mail.ru',
+            'test_password',
+            'Ivan',
+            'Ivanov',
+            '+79219084377',
+        )
+        self.client.force_login(customer)
+        response = self.client.get(self.all_cables_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Order.objects.filter(customer=customer).exists())
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'cables_shop_test_cache'),
+    }
+})
+class FileBasedCatalogueCacheTestCase(CatalogueCacheTestCase):
+    pass
+
+
+class ConditionalGetTestCase(BaseTestCase):
+    """ Not changed catalogue pages shouldn't be rendered again """
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.all_cables_url = reverse('all_cables_page')
+        self.cable_url = reverse('cable_page', kwargs={'cable_slug': self.cable.slug})
+
+    def test_not_modified(self):
+        for url in (self.all_cables_url, self.cable_url):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(len(response.templates), 0)
+
+    def test_catalogue_state_required(self):
+        class PageView(ConditionalGetMixin, TemplateView):
+            template_name = 'shop/about.html'
+
+        with self.assertRaises(ImproperlyConfigured):
+            PageView.as_view()
+
+    def test_not_modified_since(self):
+        response = self.client.get(self.all_cables_url)
+        response = self.client.get(
+            self.all_cables_url,
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_modified_after_catalogue_change(self):
+        response = self.client.get(self.cable_url)
+        self.cable.price = 200
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cable.save()
+
+        response = self.client.get(self.cable_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_modified_after_deploy(self):
+        response = self.client.get(self.all_cables_url)
+        with mock.patch('shop.utils.get_build_version', return_value='new build'):
+            response = self.client.get(self.all_cables_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_modified_after_login_and_cart_change(self):
+        anonymous_etag = self.client.get(self.all_cables_url)['ETag']
+
+        self.client.force_login(self.user)
+        response = self.client.get(self.all_cables_url, HTTP_IF_NONE_MATCH=anonymous_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+
+        self.client.post(
+            reverse('update_cart_page'),
+            {'productId': self.cable.pk, 'action': 'add_to_cart'},
+            content_type='application/json',
+        )
+        response = self.client.get(self.all_cables_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+
 class UserRegistrationTestCase(BaseTestCase):
     """ User registration related tests """
 
@@ -345,6 +687,33 @@ class CartPageTestCase(BaseTestCase):
             list(self.order_in_cart.orderedproduct_set.all())
         )
 
+    def test_queries_count_not_depends_on_cart_size(self):
+        with CaptureQueriesContext(connection) as small_cart_queries:
+            self.client.get(self.cart_url)
+
+        for i in range(5):
+            cable = Cable.objects.create(
+                name=f'test cable {i}',
+                slug=f'test-cable-{i}',
+                price=100,
+                units_in_stock=10,
+                type=self.cable_type,
+            )
+            CablePhoto.objects.create(
+                cable=cable,
+                photo=f'test_cable_photo_{i}.jpg',
+                is_title=True,
+            )
+            OrderedProduct.objects.create(
+                order=self.order_in_cart,
+                product=cable,
+                quantity=1,
+            )
+
+        with CaptureQueriesContext(connection) as big_cart_queries:
+            self.client.get(self.cart_url)
+        self.assertEqual(len(small_cart_queries), len(big_cart_queries))
+
     def test_empty_cart_redirect(self):
         self.order_in_cart.orderedproduct_set.all().delete()
         self.assertTrue(auth.get_user(self.client).is_authenticated)
@@ -382,3 +751,492 @@ class CheckoutPageTestCase(BaseTestCase):
         response = self.client.get(self.checkout_url, follow=True)
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'shop/all_cables.html')
+
+
+class CheckoutProcessTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.checkout_url = reverse('checkout_page')
+        self.client.force_login(self.user)
+        self.checkout_post_data = {
+            'first_name': 'Sergey',
+            'last_name': 'Frolov',
+            'phone_number': '+79261234567',
+            'radioDeliveryType': 'selfPickUp',
+        }
+
+    def test_checkout_decreases_units_in_stock(self):
+        response = self.client.post(self.checkout_url, self.checkout_post_data)
+        self.cable.refresh_from_db()
+        self.order_in_cart.refresh_from_db()
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.cable.units_in_stock, 7)
+        self.assertEqual(self.order_in_cart.status, Order.OrderStatus.ACCEPTED)
+
+    def checkout_after_concurrent_change(self, change) -> None:
+        """ Cart is changed after checkout view has read it, but before it's locked """
+        process_checkout = UserInformationService.process_checkout
+
+        def process_changed_checkout(service):
+            change()
+            process_checkout(service)
+
+        with mock.patch.object(
+                UserInformationService,
+                'process_checkout',
+                autospec=True,
+                side_effect=process_changed_checkout,
+        ):
+            self.client.post(self.checkout_url, self.checkout_post_data)
+
+    def test_checkout_reserves_lines_changed_before_lock(self):
+        self.checkout_after_concurrent_change(
+            lambda: OrderedProduct.objects.filter(order=self.order_in_cart).update(quantity=5)
+        )
+        self.cable.refresh_from_db()
+        self.assertEqual(self.cable.units_in_stock, 5)
+
+    def test_accepted_cart_not_checked_out_twice(self):
+        self.checkout_after_concurrent_change(
+            lambda: Order.objects.filter(pk=self.order_in_cart.pk).update(
+                status=Order.OrderStatus.ACCEPTED
+            )
+        )
+        self.cable.refresh_from_db()
+        self.assertEqual(self.cable.units_in_stock, 10)
+
+    def test_checkout_not_enough_in_stock(self):
+        """ Nothing should be changed if any product is out of stock """
+        cable_2 = Cable.objects.create(
+            name='test cable 2',
+            slug='test-cable-2',
+            price=100,
+            units_in_stock=1,
+            type=self.cable_type,
+        )
+        OrderedProduct.objects.create(
+            order=self.order_in_cart,
+            product=cable_2,
+            quantity=2,
+        )
+
+        self.client.post(self.checkout_url, self.checkout_post_data)
+        self.cable.refresh_from_db()
+        self.order_in_cart.refresh_from_db()
+
+        self.assertEqual(self.cable.units_in_stock, 10)
+        self.assertEqual(self.order_in_cart.status, Order.OrderStatus.IN_CART)
+
+    def test_checkout_cart_corrected(self):
+        """
+        Quantities greater than available should be reduced,
+        products out of stock should be removed from cart
+        """
+        cable_2 = Cable.objects.create(
+            name='test cable 2',
+            slug='test-cable-2',
+            price=100,
+            units_in_stock=0,
+            type=self.cable_type,
+        )
+        OrderedProduct.objects.create(
+            order=self.order_in_cart,
+            product=cable_2,
+            quantity=1,
+        )
+        self.cable.units_in_stock = 2
+        self.cable.save()
+        Order.objects.filter(pk=self.order_in_cart.pk).update(
+            items_total=4,
+        )
+
+        response = self.client.post(
+            self.checkout_url,
+            self.checkout_post_data,
+            follow=True,
+        )
+        self.order_in_cart.refresh_from_db()
+
+        self.assertListEqual(
+            list(self.order_in_cart.orderedproduct_set.values_list(
+                'product',
+                'quantity'
+            )),
+            [(self.cable.pk, 2)]
+        )
+        self.assertEqual(self.order_in_cart.items_total, 2)
+        self.assertEqual(self.order_in_cart.products_total_price, 200)
+        self.assertIn(
+            'test cable: 3 → 2 шт.',
+            [str(message) for message in response.context['messages']]
+        )
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentCheckoutTestCase(TransactionTestCase):
+    """ Parallel checkouts of the same cable shouldn't sell more than in stock """
+    customers_count = 50
+    units_in_stock = 10
+
+    def setUp(self):
+        self.checkout_url = reverse('checkout_page')
+        cable_type = CableType.objects.create(
+            name='test type',
+            name_plural='test type cables',
+        )
+        self.cable = Cable.objects.create(
+            name='test cable',
+            slug='test-cable',
+            price=100,
+            units_in_stock=self.units_in_stock,
+            type=cable_type,
+        )
+
+        self.customers = []
+        for i in range(self.customers_count):
+            customer = User.objects.create_user(
+                f'test{i}@test.ru',
+                'test_password',
+                'Sergey',
+                'Frolov',
+                f'+7926000{i:04}',
+            )
+            order = Order.objects.create(customer=customer, items_total=1)
+            OrderedProduct.objects.create(order=order, product=self.cable, quantity=1)
+            self.customers.append(customer)
+
+    def checkout(self, customer: User) -> None:
+        try:
+            client = Client()
+            client.force_login(customer)
+            client.post(self.checkout_url, {
+                'first_name': 'Sergey',
+                'last_name': 'Frolov',
+                'phone_number': str(customer.phone_number),
+                'radioDeliveryType': 'selfPickUp',
+            })
+        finally:
+            connection.close()
+
+    def test_no_oversell(self):
+        with ThreadPoolExecutor(max_workers=self.customers_count) as executor:
+            list(executor.map(self.checkout, self.customers))
+
+        self.cable.refresh_from_db()
+        self.assertEqual(self.cable.units_in_stock, 0)
+        self.assertEqual(
+            Order.objects.filter(status=Order.OrderStatus.ACCEPTED).count(),
+            self.units_in_stock
+        )
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentCartUpdateTestCase(TransactionTestCase):
+    """ Parallel clicks of the same customer shouldn't lose cart updates """
+    clicks_count = 20
+
+    def setUp(self):
+        self.update_cart_url = reverse('update_cart_page')
+        self.customer = User.objects.create_user(
+            'test@test.ru',
+            'test_password',
+            'Sergey',
+            'Frolov',
+            '+79261234567',
+        )
+        cable_type = CableType.objects.create(
+            name='test type',
+            name_plural='test type cables',
+        )
+        self.cable = Cable.objects.create(
+            name='test cable',
+            slug='test-cable',
+            price=100,
+            units_in_stock=100,
+            type=cable_type,
+        )
+        self.cart = Order.objects.create(customer=self.customer)
+
+    def add_to_cart(self, _) -> None:
+        try:
+            client = Client()
+            client.force_login(self.customer)
+            client.post(
+                self.update_cart_url,
+                {'productId': self.cable.pk, 'action': 'add_to_cart'},
+                content_type='application/json',
+            )
+        finally:
+            connection.close()
+
+    def click_in_parallel(self) -> None:
+        with ThreadPoolExecutor(max_workers=self.clicks_count) as executor:
+            list(executor.map(self.add_to_cart, range(self.clicks_count)))
+
+    def test_no_lost_updates(self):
+        self.click_in_parallel()
+
+        self.assertEqual(OrderedProduct.objects.get(order=self.cart).quantity, self.clicks_count)
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.items_total, self.clicks_count)
+        self.assertEqual(self.cart.products_total_price, self.clicks_count * 100)
+
+    def test_stock_bound(self):
+        Cable.objects.filter(pk=self.cable.pk).update(units_in_stock=5)
+        self.click_in_parallel()
+
+        self.assertEqual(OrderedProduct.objects.get(order=self.cart).quantity, 5)
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.items_total, 5)
+
+
+class UpdateCartTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.update_cart_url = reverse('update_cart_page')
+        self.client.force_login(self.user)
+
+    def test_add_to_cart(self):
+        response = self.client.post(
+            self.update_cart_url,
+            {'productId': self.cable.pk, 'action': 'add_to_cart'},
+            content_type='application/json',
+        )
+        self.ordered_product_1.refresh_from_db()
+        self.order_in_cart.refresh_from_db()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.ordered_product_1.quantity, 4)
+        self.assertEqual(self.order_in_cart.items_total, 4)
+
+    def update_cart(self, operations: list[dict]):
+        return self.client.post(
+            self.update_cart_url,
+            {'operations': operations},
+            content_type='application/json',
+        )
+
+    def test_batch_update(self):
+        new_cable = Cable.objects.create(
+            name='new cable',
+            slug='new-cable',
+            price=50,
+            units_in_stock=2,
+            type=self.cable_type,
+        )
+        response = self.update_cart([
+            {'productId': self.cable.pk, 'action': 'remove_from_cart', 'count': 2},
+            {'productId': new_cable.pk, 'action': 'add_to_cart', 'count': 5},
+            {'productId': self.cable.pk, 'action': 'add_to_cart'},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'lines': [
+                {'productId': self.cable.pk, 'quantity': 2, 'totalPrice': 200},
+                {'productId': new_cable.pk, 'quantity': 2, 'totalPrice': 100},
+            ],
+            'itemsTotal': 4,
+            'productsTotal': 300,
+            'total': 300 + config.DELIVERY_PRICE,
+        })
+        self.ordered_product_1.refresh_from_db()
+        self.assertEqual(self.ordered_product_1.quantity, 2)
+        # New line is capped by units in stock
+        self.assertEqual(
+            OrderedProduct.objects.get(order=self.order_in_cart, product=new_cable).quantity, 2
+        )
+        self.order_in_cart.refresh_from_db()
+        self.assertEqual(self.order_in_cart.items_total, 4)
+        self.assertEqual(self.order_in_cart.products_total_price, 300)
+
+    def test_batch_price_changed_with_same_items_total(self):
+        new_cable = Cable.objects.create(
+            name='new cable',
+            slug='new-cable',
+            price=200,
+            units_in_stock=2,
+            type=self.cable_type,
+        )
+        response = self.update_cart([
+            {'productId': new_cable.pk, 'action': 'add_to_cart'},
+            {'productId': self.cable.pk, 'action': 'remove_from_cart'},
+        ])
+
+        self.assertEqual(response.json()['itemsTotal'], 3)
+        self.assertEqual(response.json()['productsTotal'], 400)
+        self.order_in_cart.refresh_from_db()
+        self.assertEqual(self.order_in_cart.items_total, 3)
+        self.assertEqual(self.order_in_cart.products_total_price, 400)
+
+    def test_batch_delete(self):
+        response = self.update_cart([
+            {'productId': self.cable.pk, 'action': 'add_to_cart', 'count': 2},
+            {'productId': self.cable.pk, 'action': 'delete_from_cart'},
+        ])
+
+        self.assertEqual(response.json()['itemsTotal'], 0)
+        self.assertFalse(OrderedProduct.objects.filter(order=self.order_in_cart).exists())
+        self.order_in_cart.refresh_from_db()
+        self.assertEqual(self.order_in_cart.items_total, 0)
+
+    def test_whole_cart_returned(self):
+        cable_2 = Cable.objects.create(
+            name='test cable 2',
+            slug='test-cable-2',
+            price=200,
+            units_in_stock=5,
+            type=self.cable_type,
+        )
+        OrderedProduct.objects.create(order=self.order_in_cart, product=cable_2, quantity=3)
+        response = self.update_cart([
+            {'productId': self.cable.pk, 'action': 'remove_from_cart'},
+        ])
+
+        self.assertEqual(response.json(), {
+            'lines': [
+                {'productId': self.cable.pk, 'quantity': 2, 'totalPrice': 200},
+                {'productId': cable_2.pk, 'quantity': 3, 'totalPrice': 600},
+            ],
+            'itemsTotal': 5,
+            'productsTotal': 800,
+            'total': 800 + config.DELIVERY_PRICE,
+        })
+
+    def test_empty_cart_total_without_delivery(self):
+        response = self.update_cart([
+            {'productId': self.cable.pk, 'action': 'delete_from_cart'},
+        ])
+
+        self.assertEqual(response.json(), {
+            'lines': [], 'itemsTotal': 0, 'productsTotal': 0, 'total': 0,
+        })
+
+    def test_queries_not_depending_on_operations_count(self):
+        operations = [{'productId': self.cable.pk, 'action': 'add_to_cart'}]
+        with CaptureQueriesContext(connection) as one_operation:
+            self.update_cart(operations)
+        with CaptureQueriesContext(connection) as many_operations:
+            self.update_cart(operations * 5)
+        self.assertEqual(len(one_operation), len(many_operations))
+
+    def test_invalid_batch_not_applied(self):
+        for operations in (
+                [{'productId': self.cable.pk, 'action': 'add_to_cart'}, {'productId': 0, 'action': 'add_to_cart'}],
+                [{'productId': self.cable.pk, 'action': 'add_to_cart'}, {'productId': self.cable.pk, 'action': 'buy'}],
+                [{'productId': self.cable.pk, 'action': 'add_to_cart', 'count': 0}],
+                [{'action': 'add_to_cart'}],
+                [],
+        ):
+            with self.subTest(operations=operations):
+                response = self.update_cart(operations)
+                self.assertEqual(response.status_code, 200)
+                self.assertIsInstance(response.json(), str)
+                self.ordered_product_1.refresh_from_db()
+                self.assertEqual(self.ordered_product_1.quantity, 3)
+
+
+class SessionCartTestCase(BaseTestCase):
+    """ Cart of anonymous user is kept in session and merged on log in """
+
+    def setUp(self):
+        super().setUp()
+        self.update_cart_url = reverse('update_cart_page')
+        self.cart_url = reverse('cart_page')
+        self.new_cable = Cable.objects.create(
+            name='new cable',
+            slug='new-cable',
+            price=50,
+            units_in_stock=5,
+            type=self.cable_type,
+        )
+
+    def update_cart(self, operations: list[dict]):
+        return self.client.post(
+            self.update_cart_url,
+            {'operations': operations},
+            content_type='application/json',
+        )
+
+    def add_to_session_cart(self):
+        return self.update_cart([
+            {'productId': self.cable.pk, 'action': 'add_to_cart', 'count': 2},
+            {'productId': self.new_cable.pk, 'action': 'add_to_cart'},
+        ])
+
+    def test_anonymous_update_without_db_writes(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.add_to_session_cart()
+
+        self.assertEqual(response.json(), {
+            'lines': [
+                {'productId': self.cable.pk, 'quantity': 2, 'totalPrice': 200},
+                {'productId': self.new_cable.pk, 'quantity': 1, 'totalPrice': 50},
+            ],
+            'itemsTotal': 3,
+            'productsTotal': 250,
+            'total': 250 + config.DELIVERY_PRICE,
+        })
+        for query in queries:
+            self.assertTrue(query['sql'].startswith('SELECT'), query['sql'])
+
+    def test_anonymous_update_keeps_session_cart(self):
+        self.add_to_session_cart()
+        response = self.update_cart([
+            {'productId': self.cable.pk, 'action': 'delete_from_cart'},
+            {'productId': self.new_cable.pk, 'action': 'add_to_cart', 'count': 10},
+        ])
+
+        self.assertEqual(response.json()['lines'], [
+            {'productId': self.new_cable.pk, 'quantity': 5, 'totalPrice': 250},
+        ])
+
+    def test_anonymous_cart_page(self):
+        response = self.client.get(self.cart_url)
+        self.assertEqual(response.status_code, 302)
+
+        self.add_to_session_cart()
+        response = self.client.get(self.cart_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(product.product, product.quantity) for product in response.context['ordered_products']],
+            [(self.cable, 2), (self.new_cable, 1)],
+        )
+        self.assertContains(response, 'id="cartProductsTotal">250<')
+
+    def test_merge_on_login(self):
+        self.user.set_password('test_password')
+        self.user.save()
+        self.add_to_session_cart()
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(self.login_url, {
+                'email_field': self.user.email,
+                'password_field': 'test_password',
+            })
+
+        inserts = [query for query in queries if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(
+            dict(self.order_in_cart.orderedproduct_set.values_list('product', 'quantity')),
+            {self.cable.pk: 5, self.new_cable.pk: 1},
+        )
+        self.order_in_cart.refresh_from_db()
+        self.assertEqual(self.order_in_cart.items_total, 6)
+        self.assertEqual(self.order_in_cart.products_total_price, 550)
+        self.assertNotIn(config.SESSION_CART_KEY, self.client.session)
+
+    def test_anonymous_update_with_csrf_cookie(self):
+        client = Client(enforce_csrf_checks=True)
+        for url in (reverse('all_cables_page'), self.cable.get_absolute_url()):
+            with self.subTest(url=url):
+                client.cookies.clear()
+                client.get(url)
+                response = client.post(
+                    self.update_cart_url,
+                    {'productId': self.cable.pk, 'action': 'add_to_cart'},
+                    content_type='application/json',
+                    HTTP_X_CSRFTOKEN=client.cookies['csrftoken'].value,
+                )
+                self.assertEqual(response.status_code, 200)
@@ -6,6 +6,7 @@ from . import views
 urlpatterns = [
     path('', views.IndexPageView.as_view(), name='home_page'),
     path('cables/', views.AllCablesPageView.as_view(), name='all_cables_page'),
+    path('search/', views.SearchPageView.as_view(), name='search_page'),
     path('cable/<slug:cable_slug>', views.CablePageView.as_view(), name='cable_page'),
     path('user/registration/', views.UserRegistrationView.as_view(), name='user_registration_page'),
     path('user/login/', views.user_login, name='user_login_page'),
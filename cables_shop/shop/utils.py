@@ -1,6 +1,21 @@
-from typing import Optional
+import functools
+import hashlib
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import NamedTuple, Optional
 
-from .models import Order, OrderedProduct, ShippingAddress, User
+from django.contrib.staticfiles.storage import ManifestFilesMixin, staticfiles_storage
+from django.core.cache import cache
+from django.db.models import Count, F, Max, QuerySet
+from django.http import HttpRequest, QueryDict
+from django.template.loader import get_template
+from django.urls import get_resolver
+from django.utils.functional import SimpleLazyObject, cached_property
+
+from . import config
+from .models import (Cable, CablePhoto, CableType, Order, ShippingAddress,
+                     User)
 
 
 def get_last_used_customer_address(customer: User) -> Optional[ShippingAddress]:
@@ -8,15 +23,237 @@ def get_last_used_customer_address(customer: User) -> Optional[ShippingAddress]:
     return ShippingAddress.objects.filter(customer=customer).last()
 
 
-def create_empty_cart(customer: User) -> None:
-    Order.objects.get_or_create(
+def create_empty_cart(customer: User) -> Order:
+    """ Returns customer cart, empty one is created if customer has no cart """
+    cart, _ = Order.objects.get_or_create(
         customer=customer,
         status=Order.OrderStatus.IN_CART,
     )
+    return cart
+
+
+def set_lazy_cart(request: HttpRequest) -> None:
+    """
+    Set request.cart to be resolved once on first access, None if customer
+    has no cart yet. Cart is only read here, it's created by cart updates.
+    Must be called again after cart order itself was changed
+    """
+    def get_cart() -> Optional[Order]:
+        if not request.user.is_authenticated:
+            return None
+        return Order.objects.filter(
+            customer=request.user,
+            status=Order.OrderStatus.IN_CART,
+        ).first()
+
+    request.cart = SimpleLazyObject(get_cart)
+
+
+def get_cart_items_total(request: HttpRequest) -> int:
+    """ Items in customer cart or in session cart of anonymous customer """
+    if not request.user.is_authenticated:
+        return sum(request.session.get(config.SESSION_CART_KEY, {}).values())
+    if not request.cart:
+        return 0
+    return request.cart.items_total
+
+
+def update_cart_summary(order_pk: int, quantity_delta: int) -> None:
+    """ Shift stored cart items count by change of ordered products """
+    if not quantity_delta:
+        return
+    Order.objects.filter(pk=order_pk).update(
+        items_total=F('items_total') + quantity_delta,
+    )
+
+
+def get_catalogue_version() -> int:
+    """
+    Returns current catalogue version used as a key for catalogue pages cache.
+    Initial version is a timestamp, so it is not reused if the key was evicted
+    """
+    return cache.get_or_set(
+        config.CATALOGUE_VERSION_CACHE_KEY,
+        lambda: int(time.time()),
+        timeout=None,
+    )
+
+
+def bump_catalogue_version() -> None:
+    """ Invalidate catalogue pages cache """
+    try:
+        cache.incr(config.CATALOGUE_VERSION_CACHE_KEY)
+    except ValueError:
+        get_catalogue_version()
+
+
+class CatalogueState(NamedTuple):
+    last_modified: Optional[datetime]
+    objects_count: int
+
+
+def get_catalogue_state() -> CatalogueState:
+    """
+    Last modification time and objects count of all catalogue models.
+    Cached until catalogue version is changed
+    """
+    return cache.get_or_set(
+        f'catalogue_state:{get_catalogue_version()}',
+        _query_catalogue_state,
+        timeout=config.CATALOGUE_CACHE_TIMEOUT,
+    )
+
+
+def get_cable_state(cable_slug: str) -> CatalogueState:
+    """
+    Last modification time of cable, its type and photos.
+    Cached until catalogue version is changed
+    """
+    return cache.get_or_set(
+        f'cable_state:{get_catalogue_version()}:{cable_slug}',
+        lambda: _query_cable_state(cable_slug),
+        timeout=config.CATALOGUE_CACHE_TIMEOUT,
+    )
+
+
+def _query_catalogue_state() -> CatalogueState:
+    states = [
+        model.objects.aggregate(
+            last_modified=Max('updated_at'),
+            objects_count=Count('pk'),
+        )
+        for model in (CableType, Cable, CablePhoto)
+    ]
+    return CatalogueState(
+        last_modified=max(
+            (state['last_modified'] for state in states if state['last_modified']),
+            default=None,
+        ),
+        objects_count=sum(state['objects_count'] for state in states),
+    )
+
+
+def _query_cable_state(cable_slug: str) -> CatalogueState:
+    state = Cable.objects.filter(slug=cable_slug).aggregate(
+        cable_modified=Max('updated_at'),
+        type_modified=Max('type__updated_at'),
+        photo_modified=Max('cablephoto__updated_at'),
+        objects_count=Count('cablephoto'),
+    )
+    return CatalogueState(
+        last_modified=max(
+            (
+                state[field] for field in
+                ('cable_modified', 'type_modified', 'photo_modified')
+                if state[field]
+            ),
+            default=None,
+        ),
+        objects_count=state['objects_count'],
+    )
+
+
+def get_page_etag(request: HttpRequest, catalogue_state: CatalogueState) -> str:
+    """
+    ETag for catalogue page. Page header depends on user and his cart,
+    so they are part of the ETag as well
+    """
+    last_modified = catalogue_state.last_modified
+    page_state = [
+        get_build_version(),
+        last_modified.isoformat() if last_modified else '',
+        str(catalogue_state.objects_count),
+    ]
+    if request.user.is_authenticated:
+        page_state.append(str(request.user.pk))
+    page_state.append(str(get_cart_items_total(request)))
+    return hashlib.md5(':'.join(page_state).encode()).hexdigest()
+
+
+class CablesPage:
+    """
+    Page of cables for keyset (seek) pagination.
+    Cables are queried on first access, so nothing is queried
+    if the page fragment is cached
+    """
+
+    def __init__(
+            self,
+            cables: QuerySet[Cable],
+            page_size: int,
+            query_params: QueryDict,
+    ) -> None:
+        self.cables = cables
+        self.page_size = page_size
+        self.query_params = query_params
+
+    @cached_property
+    def __page_cables(self) -> list[Cable]:
+        # One more cable is queried to find out if next page exists
+        return list(self.cables[:self.page_size + 1])
+
+    def __iter__(self):
+        return iter(self.__page_cables[:self.page_size])
+
+    def __len__(self) -> int:
+        return len(self.__page_cables[:self.page_size])
+
+    @property
+    def next_page_query(self) -> str:
+        """ Query string for the next page or empty string if it's the last one """
+        if len(self.__page_cables) <= self.page_size:
+            return ''
+        last_cable = self.__page_cables[self.page_size - 1]
+        query_params = self.query_params.copy()
+        query_params['after'] = (
+            f'{last_cable.type_id}-{last_cable.price}-{last_cable.pk}'
+        )
+        return query_params.urlencode()
+
+
+TEMPLATES_DIR = Path(__file__).resolve().parent / 'templates'
+
+
+def _get_template_paths() -> list[Path]:
+    return sorted(TEMPLATES_DIR.glob('shop/*.html'))
+
+
+@functools.lru_cache(maxsize=None)
+def get_build_version() -> str:
+    """
+    Hash of shop templates and static files manifest. Pages kept by browsers
+    refer to hashed static files of their build, so they are not valid
+    after deploy even if catalogue has not changed
+    """
+    build_hash = hashlib.md5()
+    for template_path in _get_template_paths():
+        build_hash.update(template_path.read_bytes())
+    if isinstance(staticfiles_storage, ManifestFilesMixin):
+        build_hash.update((staticfiles_storage.read_manifest() or '').encode())
+    return build_hash.hexdigest()
+
+
+def compile_templates() -> int:
+    """
+    Compiles shop page templates, so cached template loader keeps them
+    and first requests don't parse them. Returns number of templates
+    """
+    template_names = [
+        template_path.relative_to(TEMPLATES_DIR).as_posix()
+        for template_path in _get_template_paths()
+    ]
+    for template_name in template_names:
+        get_template(template_name)
+    return len(template_names)
 
 
-def save_or_delete_ordered_product(ordered_product: OrderedProduct) -> None:
-    if ordered_product.quantity <= 0:
-        ordered_product.delete()
-    else:
-        ordered_product.save()
+def warm_up() -> None:
+    """
+    Compiles URL patterns and reads build version, so workers forked by app
+    server share them and first requests are not slower. Templates are
+    compiled by ShopConfig.ready. Database is not queried, its connections
+    must not be inherited by workers
+    """
+    # Populating reverse lookups compiles all URL patterns
+    get_resolver().reverse_dict
+    get_build_version()
@@ -1,23 +1,103 @@
+import abc
+import inspect
+
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.exceptions import ImproperlyConfigured
 from django.http import HttpRequest, JsonResponse
 from django.shortcuts import redirect, render
 from django.urls import reverse_lazy
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date, quote_etag
+from django.views import static
+from django.views.decorators.csrf import ensure_csrf_cookie
 from django.views.generic import (FormView, RedirectView, TemplateView, detail,
                                   list)
 
 from shop import config
 
-from . import utils
+from . import search, storage, utils
 from .exceptions import *
-from .forms import UserRegistrationForm
-from .models import Cable, CablePhoto, CableType, Order, OrderedProduct
-from .services import CartUpdateService, UserInformationService
+from .forms import CableFilterForm, UserRegistrationForm
+from .models import Cable, CableType, Order, OrderedProduct
+from .services import CartUpdateService, SessionCart, UserInformationService
+
+
+class CatalogueCacheMixin:
+    """
+    Adds catalogue fragments cache parameters to context.
+    Cached fragments are invalidated by catalogue version change
+    """
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['catalogue_version'] = utils.get_catalogue_version()
+        context['catalogue_cache_timeout'] = config.CATALOGUE_CACHE_TIMEOUT
+        return context
+
+
+class ConditionalGetMixin(abc.ABC):
+    """
+    Responds with 304 without rendering the page
+    if catalogue and user cart have not changed since last visit.
+    Views must implement get_catalogue_state, it's checked on URLconf loading
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        if inspect.isabstract(cls):
+            raise ImproperlyConfigured(
+                f'{cls.__name__} must implement {", ".join(sorted(cls.__abstractmethods__))}'
+            )
+        return super().as_view(**initkwargs)
+
+    @abc.abstractmethod
+    def get_catalogue_state(self) -> utils.CatalogueState:
+        """ State of catalogue shown on the page """
+
+    def get(self, request: HttpRequest, *args, **kwargs):
+        catalogue_state = self.get_catalogue_state()
+        etag = quote_etag(utils.get_page_etag(request, catalogue_state))
+        # Header of the page is changed on log in and by cart, so date is not enough
+        last_modified = None
+        if (
+                catalogue_state.last_modified
+                and not request.user.is_authenticated
+                and not utils.get_cart_items_total(request)
+        ):
+            last_modified = int(catalogue_state.last_modified.timestamp())
+
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=last_modified,
+        )
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+
+        response.headers['ETag'] = etag
+        if last_modified:
+            response.headers['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, no_cache=True)
+        return response
 
 
-class IndexPageView(list.ListView):
+class CartButtonsMixin:
+    """
+    Pages with add to cart buttons. cart.js posts clicks
+    of anonymous users too, so they need CSRF cookie
+    """
+
+    @method_decorator(ensure_csrf_cookie)
+    def dispatch(self, request: HttpRequest, *args, **kwargs):
+        return super().dispatch(request, *args, **kwargs)
+
+
+class IndexPageView(CatalogueCacheMixin, list.ListView):
     """ Home page with cable types displayed on it"""
     model = CableType
     context_object_name = 'cable_types'
@@ -29,30 +109,60 @@ class IndexPageView(list.ListView):
         return context
 
 
-class AllCablesPageView(list.ListView):
+class AllCablesPageView(CartButtonsMixin, ConditionalGetMixin, CatalogueCacheMixin, list.ListView):
     """
     All cables for sale is displayed on this page.
-    Cables are queried via related title photos
+    Cables are filtered and paginated by the database
     """
-    model = CablePhoto
-    context_object_name = 'photos'
+    model = Cable
+    context_object_name = 'cables'
     template_name = 'shop/all_cables.html'
 
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super().get_context_data(**kwargs)
         context['title'] = config.ALL_CABLES_PAGE_TITLE
+        context['filter_form'] = self.filter_form
+        context['filter_query'] = self.filter_query.urlencode()
         return context
 
     def get_queryset(self):
         # Showing on the page only cables marked as for sale
-        title_photos = CablePhoto.objects.filter(
-            is_title=True,
-            cable__is_for_sale=True,
-        ).select_related('cable').select_related('cable__type')
-        return title_photos
+        self.filter_form = CableFilterForm(self.request.GET)
+        cables = self.filter_form.filter_cables(
+            Cable.objects.for_sale().with_title_photo().select_related('type')
+        )
+        # Page fragment is cached by valid filters only, so filter form
+        # and next page link are rendered from them, not from raw query
+        self.filter_query = self.filter_form.get_valid_query()
+        self.filter_form.data = self.filter_query
+        return utils.CablesPage(cables, config.CABLES_PAGE_SIZE, self.filter_query)
+
+    def get_catalogue_state(self) -> utils.CatalogueState:
+        return utils.get_catalogue_state()
+
+
+class SearchPageView(CartButtonsMixin, list.ListView):
+    """ Cables for sale found by search query """
+    context_object_name = 'cables'
+    template_name = 'shop/search.html'
+
+    def get_context_data(self, *, object_list=None, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['title'] = config.SEARCH_PAGE_TITLE
+        context['query'] = self.query
+        return context
+
+    def get_queryset(self):
+        self.query = self.request.GET.get('q', '').strip()[:config.SEARCH_QUERY_MAX_LENGTH]
+        if not self.query:
+            return Cable.objects.none()
+        # Limit is applied after for sale filter, so hidden cables don't take places
+        return search.search_cables(
+            self.query
+        ).for_sale().with_title_photo().select_related('type')[:config.SEARCH_RESULTS_LIMIT]
 
 
-class CablePageView(detail.DetailView):
+class CablePageView(CartButtonsMixin, ConditionalGetMixin, CatalogueCacheMixin, detail.DetailView):
     """ Detailed page for each cable """
     model = Cable
     context_object_name = 'cable'
@@ -64,24 +174,29 @@ class CablePageView(detail.DetailView):
         context['title'] = f'Hi-Fi store - {context.get("cable").name}'
         return context
 
+    def get_catalogue_state(self) -> utils.CatalogueState:
+        return utils.get_cable_state(self.kwargs.get(self.slug_url_kwarg))
+
 
-class CartPageView(LoginRequiredMixin, list.ListView):
+class CartPageView(list.ListView):
     """
-    Cart page. Can only be accessed by logged in users
-    with at least one item in cart
+    Cart page. Can only be accessed with at least one item in cart,
+    anonymous users see their session cart
     """
-    login_url = 'user_login_page'
     model = OrderedProduct
     context_object_name = 'ordered_products'
     template_name = 'shop/cart.html'
 
     def get(self, *args, **kwargs):
         """ Redirect user if he tries to access empty cart """
-        ordered_products = OrderedProduct.objects.filter(
-            order__customer=self.request.user,
-            order__status=Order.OrderStatus.IN_CART
-        )
-        if not ordered_products:
+        if self.request.user.is_authenticated:
+            is_empty = not (
+                self.request.cart
+                and OrderedProduct.objects.filter(order=self.request.cart).exists()
+            )
+        else:
+            is_empty = not SessionCart(self.request.session).quantities
+        if is_empty:
             return redirect('all_cables_page')
         return super(CartPageView, self).get(*args, **kwargs)
 
@@ -91,17 +206,18 @@ class CartPageView(LoginRequiredMixin, list.ListView):
         return context
 
     def get_queryset(self):
+        if not self.request.user.is_authenticated:
+            return SessionCart(self.request.session).get_ordered_products()
         # Getting only products in cart for this customer
         ordered_products = OrderedProduct.objects.filter(
-            order__customer=self.request.user,
-            order__status=Order.OrderStatus.IN_CART
-        ).order_by('date_added').select_related('product')
+            order=self.request.cart
+        ).order_by('date_added').with_product_title_photo()
         return ordered_products
 
 
 @login_required(login_url='user_login_page')
 def checkout(request: HttpRequest):
-    checkout_service = UserInformationService(request.user, request.POST)
+    checkout_service = UserInformationService(request)
 
     # Redirect user if his cart is empty
     if not checkout_service.ordered_products:
@@ -125,12 +241,18 @@ def checkout(request: HttpRequest):
             )
             return redirect('checkout_page')
         except ProductsQuantityError:
-            checkout_service.correct_ordered_products()
+            corrections = checkout_service.correct_ordered_products()
             messages.error(
                 request,
                 'Количество некоторых товаров в наличии изменилось. '
                 'Корзина была обновлена. Пожалуйста повторите отправку заказа.'
             )
+            for correction in corrections:
+                messages.error(
+                    request,
+                    f'{correction.product.name}: {correction.ordered_quantity} → '
+                    f'{correction.available_quantity} шт.'
+                )
             return redirect('checkout_page')
         return redirect('home_page')
 
@@ -143,20 +265,20 @@ def checkout(request: HttpRequest):
     return render(request, 'shop/checkout.html', context)
 
 
-@login_required(login_url='user_login_page')
 def update_cart(request: HttpRequest):
     """
-    This view is working with JSON-response sent by cart.js on every
-    cart items related button click (add, remove, delete)
+    This view is working with JSON-response sent by cart.js with
+    cart items related button clicks (add, remove, delete) made in a row.
+    Anonymous users cart is updated in session
     """
     try:
-        CartUpdateService(request).process_cart_update()
+        cart_summary = CartUpdateService(request).process_cart_update()
     except JSONResponseParsingError:
         return JsonResponse('Error during parsing response', safe=False)
     except CartUpdateError:
         return JsonResponse('Error during cart update', safe=False)
 
-    return JsonResponse('Cart has been updated', safe=False)
+    return JsonResponse(cart_summary.as_json())
 
 
 class UserRegistrationView(FormView):
@@ -195,8 +317,10 @@ def user_login(request: HttpRequest):
         return render(request, 'shop/login.html', contex)
 
     login(request, user)
-    # create empty cart if user has no cart
-    utils.create_empty_cart(request.user)
+    # Products added before log in, cart is created only if there are any
+    session_cart = SessionCart(request.session)
+    if session_cart.quantities:
+        session_cart.merge_into(utils.create_empty_cart(request.user))
     return redirect('home_page')
 
 
@@ -226,7 +350,7 @@ class UserProfileView(LoginRequiredMixin, list.ListView):
     def get_queryset(self):
         checked_out_customer_orders = Order.objects.filter(
             customer=self.request.user
-        ).exclude(status=Order.OrderStatus.IN_CART).order_by('-pk')
+        ).exclude(status=Order.OrderStatus.IN_CART).order_by('-pk').with_totals()
         return checked_out_customer_orders
 
 
@@ -236,6 +360,7 @@ class OrderView(LoginRequiredMixin, detail.DetailView):
     context_object_name = 'order'
     pk_url_kwarg = 'order_pk'
     template_name = 'shop/order_info.html'
+    queryset = Order.objects.with_totals()
 
     def get(self, *args, **kwargs):
         """
@@ -254,12 +379,13 @@ class OrderView(LoginRequiredMixin, detail.DetailView):
         context['title'] = f'Hi-Fi store - Заказ №{self.object.pk}'
         context['delivery_price'] = config.DELIVERY_PRICE
 
-        order = self.get_object()
-        context['ordered_products'] = order.orderedproduct_set.select_related('product')
+        context['ordered_products'] = (
+            self.object.orderedproduct_set.with_product_title_photo()
+        )
         return context
 
 
-class AboutPageView(TemplateView):
+class AboutPageView(CatalogueCacheMixin, TemplateView):
     template_name = 'shop/about.html'
 
     def get_context_data(self, **kwargs):
@@ -269,7 +395,7 @@ class AboutPageView(TemplateView):
 
 
 def update_user_info(request: HttpRequest):
-    update_info_service = UserInformationService(request.user, request.POST)
+    update_info_service = UserInformationService(request)
     form = update_info_service.form
 
     if request.method == 'POST' and form.is_valid():
@@ -289,3 +415,20 @@ def update_user_info(request: HttpRequest):
         'form': form
     }
     return render(request, 'shop/update_user_info.html', contex)
+
+
+def serve_media(request: HttpRequest, path: str):
+    """
+    Uploaded files in development. Files named by content hash never change,
+    so browsers cache them without revalidation. Front server should send
+    the same headers in production
+    """
+    response = static.serve(request, path, document_root=settings.MEDIA_ROOT)
+    if response.status_code == 200 and storage.is_hashed_name(path):
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=config.MEDIA_CACHE_MAX_AGE,
+            immutable=True,
+        )
+    return response